@@ -0,0 +1,216 @@
+"""Deterministic synthetic media corpus for benchmarks."""
+
+import hashlib
+import json
+import shutil
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+# bump version when generated content changes, an existing corpus is then regenerated
+CORPUS_VERSION = 1
+
+# images sizes by name, (width, height)
+IMAGE_SIZES = {"small": (640, 480), "medium": (1920, 1080), "large": (4032, 3024)}
+
+# images formats and Pillow save parameters, by extention
+IMAGE_FORMATS = {
+    ".png": ("PNG", {}),
+    ".tif": ("TIFF", {}),
+    ".webp": ("WEBP", {"quality": 90}),
+    ".heic": ("HEIF", {"quality": 90}),
+}
+
+# number of images generated by size and format
+IMAGES_PER_FORMAT = 2
+
+# videos generated with ffmpeg lavfi sources: (name, size, duration in seconds, ffmpeg video codec args)
+VIDEOS = [
+    ("testsrc_small.mov", "640x360", 3, ["-c:v", "mpeg4", "-q:v", "3"]),
+    ("testsrc_medium.mp4", "1280x720", 3, ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"]),
+    ("mandelbrot_medium.mkv", "1280x720", 3, ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"]),
+]
+
+# unknown format filler files: (name, size in bytes)
+FILLERS = [
+    ("notes.txt", 4 * 1024),
+    ("document.pdf", 2 * 1024 * 1024),
+    ("archive.bin", 32 * 1024 * 1024),
+]
+
+
+def get_corpus_spec(seed):
+    """Get the corpus specification, two corpus with the same specification have the same content.
+
+    Args:
+        seed (int): Random generator seed.
+
+    Returns:
+        dict: Corpus specification.
+    """
+    return {
+        "version": CORPUS_VERSION,
+        "seed": seed,
+        "image_sizes": IMAGE_SIZES,
+        "image_formats": list(IMAGE_FORMATS.keys()),
+        "images_per_format": IMAGES_PER_FORMAT,
+        "videos": VIDEOS,
+        "fillers": FILLERS,
+    }
+
+
+def get_corpus_hash(spec):
+    """Get corpus specification hash.
+
+    Args:
+        spec (dict): Corpus specification.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest of the specification.
+    """
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def generate_image(rng, size):
+    """Generate a photo like image, smooth gradients with noise and edges, so that encoders have real work.
+
+    Args:
+        rng (numpy.random.Generator): Random generator.
+        size (tuple): Image size (width, height).
+
+    Returns:
+        PIL.Image.Image: RGB image.
+    """
+    width, height = size
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :]
+    y = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+
+    phases = rng.uniform(0.0, 2.0 * np.pi, size=3)
+    channels = [
+        0.5 + 0.25 * np.sin(6.0 * x + phases[i]) + 0.25 * np.cos(4.0 * y + 2.0 * x * y + phases[i]) for i in range(3)
+    ]
+    array = np.stack(channels, axis=-1) * np.float32(200.0)
+
+    # add a few hard edged rectangles and sensor like noise
+    for _ in range(8):
+        x0, y0 = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        x1, y1 = x0 + width // 4, y0 + height // 4
+        array[y0:y1, x0:x1] += rng.uniform(-60.0, 60.0, size=3)
+
+    array += rng.standard_normal(size=array.shape, dtype=np.float32) * 6.0
+    return Image.fromarray(np.clip(array, 0, 255).astype(np.uint8), "RGB")
+
+
+def generate_images(path_images, rng):
+    """Generate images of every size and format.
+
+    Args:
+        path_images (pathlib.Path): Images directory path.
+        rng (numpy.random.Generator): Random generator.
+    """
+    import pillow_heif
+
+    pillow_heif.register_heif_opener()
+
+    for size_name, size in IMAGE_SIZES.items():
+        path_size = path_images / size_name
+        path_size.mkdir(parents=True)
+
+        for ext, (fmt, params) in IMAGE_FORMATS.items():
+            for idx in range(IMAGES_PER_FORMAT):
+                image = generate_image(rng, size)
+                image.save(path_size / f"image_{idx}{ext}", fmt, **params)
+
+
+def generate_videos(path_videos):
+    """Generate videos from ffmpeg lavfi test sources, with a sine audio track.
+
+    Args:
+        path_videos (pathlib.Path): Videos directory path.
+    """
+    path_videos.mkdir(parents=True)
+
+    for name, size, duration, codec_args in VIDEOS:
+        source = "mandelbrot" if name.startswith("mandelbrot") else "testsrc2"
+
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                f"{source}=size={size}:rate=30",
+                "-f",
+                "lavfi",
+                "-i",
+                "sine=frequency=440:sample_rate=48000",
+                "-t",
+                str(duration),
+                *codec_args,
+                "-pix_fmt",
+                "yuv420p",
+                "-c:a",
+                "aac",
+                "-fflags",
+                "+bitexact",
+                "-flags",
+                "+bitexact",
+                "-threads",
+                "1",
+                str(path_videos / name),
+            ],
+            check=True,
+        )
+
+
+def generate_fillers(path_other, rng):
+    """Generate unknown format files with incompressible content.
+
+    Args:
+        path_other (pathlib.Path): Unknown format files directory path.
+        rng (numpy.random.Generator): Random generator.
+    """
+    path_other.mkdir(parents=True)
+
+    for name, size in FILLERS:
+        (path_other / name).write_bytes(rng.bytes(size))
+
+
+def generate_corpus(path_corpus, seed=0, force=False):
+    """Generate the benchmark corpus, with one directory by category (images, videos, other).
+    An existing corpus with the same specification is reused.
+
+    Args:
+        path_corpus (pathlib.Path): Corpus directory path.
+        seed (int, optional): Random generator seed. Defaults to 0.
+        force (bool, optional): If true, corpus is always regenerated. Defaults to False.
+
+    Returns:
+        str: Corpus specification hash.
+    """
+    spec = get_corpus_spec(seed)
+    corpus_hash = get_corpus_hash(spec)
+    path_spec = path_corpus / "corpus.json"
+
+    if not force and path_spec.is_file():
+        with open(path_spec, "r", encoding="utf-8") as f:
+            if json.load(f).get("hash") == corpus_hash:
+                return corpus_hash
+
+    shutil.rmtree(path_corpus, ignore_errors=True)
+    path_corpus.mkdir(parents=True)
+
+    rng = np.random.default_rng(seed)
+    generate_images(path_corpus / "images", rng)
+    generate_videos(path_corpus / "videos")
+    generate_fillers(path_corpus / "other", rng)
+
+    # specification is written last, an interrupted generation is detected and restarted
+    with open(path_spec, "w", encoding="utf-8") as f:
+        json.dump({"hash": corpus_hash, "spec": spec}, f, indent=2)
+
+    return corpus_hash
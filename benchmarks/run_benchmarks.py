@@ -0,0 +1,488 @@
+"""Benchmark entry script.
+
+Run from repository root:
+    python -m benchmarks.run_benchmarks -o results.json [-c baseline.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.corpus import generate_corpus
+
+# corpus categories, each one is a directory of the corpus
+CATEGORIES = ["images", "videos", "other"]
+
+# benchmarked settings, config values overriden by dotted keys
+SETTINGS = {
+    "serial": {"workers": 1},
+    "parallel": {"workers": 0},
+    "parallel_4": {"workers": 4},
+    "parallel_skip_prediction": {"workers": 0, "skip_prediction.enabled": True},
+    "parallel_max_dimension": {"workers": 0, "compress_params.JPEG.max_dimension": 2048},
+}
+
+# metrics compared between two results files, True if higher is better
+METRICS = {"files_per_s": True, "mb_per_s": True, "wall_time": False, "peak_rss_mb": False}
+
+# startup metrics compared between two results files, lower is better
+STARTUP_METRICS = ["import_s", "per_file_ms"]
+
+# number of tiny images compressed to measure per file overhead
+STARTUP_FILES = 50
+
+# settings whose outputs and statistics must be identical, (reference setting, compared setting),
+# parallel_4 runs the parallel path even on hosts with a single core
+IDENTICAL_SETTINGS = [("serial", "parallel"), ("serial", "parallel_4")]
+
+# read size while hashing outputs
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_peak_rss_mb(who):
+    """Get peak resident set size.
+    On Linux, peak of current process is read from /proc, since ru_maxrss keeps the peak of the
+    parent process memory when a process is started with exec.
+
+    Args:
+        who (int): resource.RUSAGE_SELF or resource.RUSAGE_CHILDREN (largest child process).
+
+    Returns:
+        float: Peak resident set size in MB.
+    """
+    if who == resource.RUSAGE_SELF and os.path.isfile("/proc/self/status"):
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+
+    peak_rss = resource.getrusage(who).ru_maxrss
+
+    # bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak_rss / 1024**2
+    return peak_rss / 1024
+
+
+def set_config_value(config, key, value):
+    """Set a config value from a dotted key.
+
+    Args:
+        config (dict): Config dictionary.
+        key (str): Dotted key ("compress_params.JPEG.quality", ...).
+        value (any): Config value.
+    """
+    keys = key.split(".")
+
+    for k in keys[:-1]:
+        config = config.setdefault(k, {})
+
+    config[keys[-1]] = value
+
+
+def get_output_hash(path_data, path_summary):
+    """Hash outputs content and statistics of a run, without timings, so that runs of two settings can be compared.
+
+    Args:
+        path_data (pathlib.Path): Project data path.
+        path_summary (pathlib.Path): Project summary path.
+
+    Returns:
+        str: Outputs hash.
+    """
+    from mediaz.stats import TIMING_COLUMNS, StatsRecorder
+
+    digest = hashlib.sha256()
+
+    for path in sorted(path for path in path_data.rglob("*") if path.is_file()):
+        digest.update(str(path.relative_to(path_data)).encode("utf-8"))
+
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+
+    # output paths are relative to project, projects of two settings differ
+    for in_path, row in sorted(StatsRecorder(path_summary).read().items()):
+        row = {column: value for column, value in row.items() if column not in TIMING_COLUMNS}
+        row["out_path"] = str(Path(row["out_path"]).relative_to(path_data))
+        digest.update(json.dumps(row, sort_keys=True).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def run_case(path_config, path_in, path_project, setting, path_result):
+    """Compress a corpus category with a setting, in the current process, and write its result.
+
+    Args:
+        path_config (pathlib.Path): Base config YAML file path.
+        path_in (pathlib.Path): Corpus category directory path.
+        path_project (pathlib.Path): Project directory path, must not exist.
+        setting (str): Setting name.
+        path_result (pathlib.Path): Result JSON file path.
+    """
+    # imported here so that import time is part of the measure
+    start = time.perf_counter()
+
+    from mediaz.api import bulk_compress
+    from mediaz.utils import open_project, read_yml
+    from mediaz.walk import index_directory
+
+    config = read_yml(str(path_config))
+    config["in_path"] = str(path_in)
+
+    for key, value in SETTINGS[setting].items():
+        set_config_value(config, key, value)
+
+    (path_project / "data").mkdir(parents=True)
+    (path_project / "summary").mkdir()
+
+    index = index_directory(path_in, config.get("walk_workers", 1))
+    path_data, path_summary = open_project(path_project, path_in, config["apply_snake_case"], index)
+    bulk_compress(config, path_in, path_data, path_summary, True, index)
+
+    wall_time = time.perf_counter() - start
+
+    n_files = len(index.files)
+    in_bytes = sum(size for size, _ in index.files.values())
+    out_bytes = sum(path.stat().st_size for path in path_data.rglob("*") if path.is_file())
+
+    result = {
+        "setting": setting,
+        "category": path_in.name,
+        "files": n_files,
+        "in_bytes": in_bytes,
+        "out_bytes": out_bytes,
+        "wall_time": wall_time,
+        "files_per_s": n_files / wall_time,
+        "mb_per_s": in_bytes / 1024**2 / wall_time,
+        "peak_rss_mb": get_peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_children_rss_mb": get_peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "output_hash": get_output_hash(path_data, path_summary),
+    }
+
+    with open(path_result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_startup(path_config, path_startup, path_result):
+    """Measure import time of the compression module and per file overhead, in the current process.
+    Per file overhead is measured on tiny images, where fixed costs (media resolution, codecs registration,
+    logging, file system calls) dominate compression itself.
+
+    Args:
+        path_config (pathlib.Path): Base config YAML file path.
+        path_startup (pathlib.Path): Tiny images directory path.
+        path_result (pathlib.Path): Result JSON file path.
+    """
+    start = time.perf_counter()
+
+    from mediaz.compress import compress
+
+    import_s = time.perf_counter() - start
+
+    from mediaz.utils import read_yml
+
+    config = read_yml(str(path_config))
+    path_out = path_startup / "out"
+    shutil.rmtree(path_out, ignore_errors=True)
+    path_out.mkdir()
+
+    path_in_files = sorted(path_startup.glob("*.png"))
+    start = time.perf_counter()
+
+    for path_in_file in path_in_files:
+        compress(path_in_file, path_out / f"{path_in_file.stem}.jpg", config)
+
+    per_file_ms = (time.perf_counter() - start) / len(path_in_files) * 1000
+
+    with open(path_result, "w", encoding="utf-8") as f:
+        json.dump({"import_s": import_s, "per_file_ms": per_file_ms}, f)
+
+
+def measure_startup(path_config, path_work, repeat):
+    """Measure import time and per file overhead, each run in a fresh process, the fastest run is kept.
+
+    Args:
+        path_config (pathlib.Path): Base config YAML file path.
+        path_work (pathlib.Path): Work directory path.
+        repeat (int): Number of runs.
+
+    Returns:
+        dict: Import time in seconds and per file overhead in milliseconds.
+    """
+    from PIL import Image
+
+    path_startup = path_work / "startup"
+    path_startup.mkdir(parents=True, exist_ok=True)
+
+    for idx in range(STARTUP_FILES):
+        path = path_startup / f"tiny_{idx}.png"
+
+        if not path.is_file():
+            Image.new("RGB", (16, 16), (idx * 5 % 256, 128, 64)).save(path)
+
+    runs = []
+    path_result = path_startup / "startup.json"
+
+    for _ in range(repeat):
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.run_benchmarks",
+                "--startup",
+                str(path_config),
+                str(path_startup),
+                str(path_result),
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        with open(path_result, "r", encoding="utf-8") as f:
+            runs.append(json.load(f))
+
+    return {metric: min(run[metric] for run in runs) for metric in STARTUP_METRICS}
+
+
+def run_benchmarks(path_config, path_work, settings, categories, seed, repeat):
+    """Run each setting over each corpus category, each run in a fresh process.
+
+    Args:
+        path_config (pathlib.Path): Base config YAML file path, settings override its values.
+        path_work (pathlib.Path): Work directory path, holding the corpus and the runs projects.
+        settings (list): Settings names.
+        categories (list): Corpus categories.
+        seed (int): Corpus random generator seed.
+        repeat (int): Number of runs by setting and category, the fastest run is kept.
+
+    Returns:
+        dict: Benchmark results.
+    """
+    path_corpus = path_work / "corpus"
+    path_runs = path_work / "runs"
+
+    start = time.perf_counter()
+    corpus_hash = generate_corpus(path_corpus, seed)
+    print(f"Corpus ready in {time.perf_counter() - start:.1f}s: {path_corpus}")
+
+    startup = measure_startup(path_config, path_work, repeat)
+    print(f"{'startup':<28} import {startup['import_s']:.3f}s, {startup['per_file_ms']:.2f} ms by file overhead")
+
+    results = []
+
+    for setting in settings:
+        for category in categories:
+            runs = []
+
+            for idx in range(repeat):
+                path_project = path_runs / f"{setting}_{category}_{idx}"
+                path_result = path_runs / f"{setting}_{category}_{idx}.json"
+                shutil.rmtree(path_project, ignore_errors=True)
+
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.run_benchmarks",
+                        "--case",
+                        str(path_config),
+                        str(path_corpus / category),
+                        str(path_project),
+                        setting,
+                        str(path_result),
+                    ],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                )
+
+                with open(path_result, "r", encoding="utf-8") as f:
+                    runs.append(json.load(f))
+
+            result = min(runs, key=lambda run: run["wall_time"])
+            result["runs"] = [run["wall_time"] for run in runs]
+            results.append(result)
+
+            print(
+                f"{setting:<28} {category:<8} {result['files']:>5} files {result['wall_time']:>8.2f}s "
+                f"{result['files_per_s']:>8.2f} files/s {result['mb_per_s']:>8.2f} MB/s "
+                f"{result['peak_rss_mb']:>8.1f} MB RSS"
+            )
+
+    identical = compare_outputs(results)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus_hash": corpus_hash,
+        },
+        "startup": startup,
+        "results": results,
+        "identical": identical,
+    }
+
+
+def compare_outputs(results):
+    """Check that settings expected to give identical outputs (serial and parallel runs) do, by corpus category.
+
+    Args:
+        results (list): Results of settings and categories.
+
+    Returns:
+        dict: True if outputs and statistics are identical, by "reference_setting/compared_setting/category".
+    """
+    hashes = {(result["setting"], result["category"]): result["output_hash"] for result in results}
+    identical = {}
+
+    for reference, compared in IDENTICAL_SETTINGS:
+        for (setting, category), output_hash in sorted(hashes.items()):
+            if setting != reference or (compared, category) not in hashes:
+                continue
+
+            identical[f"{reference}/{compared}/{category}"] = output_hash == hashes[(compared, category)]
+            status = "identical" if identical[f"{reference}/{compared}/{category}"] else "DIFFERENT"
+            print(f"{reference + ' vs ' + compared:<28} {category:<8} outputs and statistics {status}")
+
+    return identical
+
+
+def compare_results(baseline, current):
+    """Print the relative change of each metric between two benchmark results.
+
+    Args:
+        baseline (dict): Baseline benchmark results.
+        current (dict): Current benchmark results.
+    """
+    if baseline["meta"]["corpus_hash"] != current["meta"]["corpus_hash"]:
+        print("Warning: results were measured on different corpus.")
+
+    # results written before startup was measured have no startup metrics
+    if "startup" in baseline:
+        changes = []
+
+        for metric in STARTUP_METRICS:
+            old, new = baseline["startup"][metric], current["startup"][metric]
+            change = (new - old) / old * 100 if old else 0.0
+            changes.append(f"{metric} {old:.3f} -> {new:.3f} ({change:+.1f}% {'better' if change <= 0 else 'worse'})")
+
+        print(f"{'startup':<37} " + ", ".join(changes))
+
+    baseline_results = {(r["setting"], r["category"]): r for r in baseline["results"]}
+
+    for result in current["results"]:
+        key = (result["setting"], result["category"])
+
+        if key not in baseline_results:
+            continue
+
+        changes = []
+
+        for metric, higher_is_better in METRICS.items():
+            old, new = baseline_results[key][metric], result[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            better = change >= 0 if higher_is_better else change <= 0
+            changes.append(f"{metric} {old:.2f} -> {new:.2f} ({change:+.1f}% {'better' if better else 'worse'})")
+
+        print(f"{key[0]:<28} {key[1]:<8} " + ", ".join(changes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run mediaz benchmarks on a synthetic corpus.")
+
+    parser.add_argument(
+        "-pc",
+        "--path_config",
+        type=str,
+        default="./config.yml",
+        help="Path of base config file, benchmarked settings override its values.",
+    )
+
+    parser.add_argument(
+        "-pw",
+        "--path_work",
+        type=str,
+        default="./benchmarks/work",
+        help="Path of work directory, holding the generated corpus and the runs projects.",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="./benchmarks/results.json",
+        help="Path of output results JSON file.",
+    )
+
+    parser.add_argument(
+        "-c",
+        "--compare",
+        type=str,
+        default=None,
+        help="Path of a baseline results JSON file to compare with.",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--settings",
+        nargs="+",
+        choices=list(SETTINGS.keys()),
+        default=list(SETTINGS.keys()),
+        help="Settings to benchmark.",
+    )
+
+    parser.add_argument(
+        "-ca",
+        "--categories",
+        nargs="+",
+        choices=CATEGORIES,
+        default=CATEGORIES,
+        help="Corpus categories to benchmark.",
+    )
+
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random generator seed.")
+
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="Number of runs, the fastest one is kept.")
+
+    # internal, run a single case in this process
+    parser.add_argument("--case", nargs=5, default=None, help=argparse.SUPPRESS)
+
+    # internal, measure startup in this process
+    parser.add_argument("--startup", nargs=3, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.case is not None:
+        path_config, path_in, path_project, setting, path_result = args.case
+        run_case(Path(path_config), Path(path_in), Path(path_project), setting, Path(path_result))
+
+    elif args.startup is not None:
+        path_config, path_startup, path_result = args.startup
+        run_startup(Path(path_config), Path(path_startup), Path(path_result))
+
+    else:
+        results = run_benchmarks(
+            Path(args.path_config).resolve(),
+            Path(args.path_work),
+            args.settings,
+            args.categories,
+            args.seed,
+            args.repeat,
+        )
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+        if args.compare is not None:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                compare_results(json.load(f), results)
@@ -0,0 +1,442 @@
+"""Streaming library API, to compress files from Python code and get a result record as soon as each file is done.
+Bulk compression of an input directory into a project (command line) consumes this API.
+
+Example:
+    from mediaz.api import stream_compress
+
+    for result in stream_compress([("in/a.png", "out/a.jpg"), ("in/b.mov", "out/b.mp4")], workers=4):
+        print(result.in_path, result.status, result.out_size)
+"""
+
+import copy
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from mediaz.compress import check_config, copy_duplicate, get_input_media_class, get_workers, iter_jobs, split_jobs
+from mediaz.dedup import find_duplicates
+from mediaz.dtype.dtype import get_dtype, get_formats
+from mediaz.dtype.dtype_support import DataTypesOut
+from mediaz.manifest import get_config_hash, is_unchanged, read_manifest, write_manifest_entry
+from mediaz.shard import get_shard_name, in_shard
+from mediaz.stats import StatsRecorder, write_timings_summary
+from mediaz.utils import get_files_paths, get_logger, read_yml, verify_number_of_files
+from mediaz.walk import index_directory
+
+logger = get_logger(__name__)
+
+# default config, compression parameters of repository config file
+PATH_DEFAULT_CONFIG = Path(__file__).resolve().parent.parent / "config.yml"
+
+
+@dataclass(frozen=True)
+class MediaInput:
+    """Input file of the streaming API, and its output path.
+    Input data can be given in memory, input path then only gives input name and format (extention).
+    """
+
+    path_in: Union[str, Path]
+    path_out: Union[str, Path]
+    data: Optional[bytes] = None
+    in_size: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class CompressResult:
+    """Result of a compressed file, one field by statistics column (see mediaz.stats.STATS_COLUMNS).
+
+    Status values:
+        0: Unknown input format, input file is copied.
+        1: Input file is compressed.
+        2: Compressed file is larger than input file, input file is copied.
+        3: Compression failed, input file is copied.
+        4: Compression is not predicted to reduce size, input file is copied.
+        5: Input file is a duplicate of another input file.
+    """
+
+    in_path: str
+    in_size: int
+    out_path: str
+    out_compressed_size: int
+    out_size: int
+    status: int
+    jpeg_quality: Optional[int] = None
+    video_action: Optional[str] = None
+    in_duration: Optional[float] = None
+    video_segments: Optional[int] = None
+    copy_method: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    time_stat: Optional[float] = None
+    time_read: Optional[float] = None
+    time_convert: Optional[float] = None
+    time_write: Optional[float] = None
+    time_copy: Optional[float] = None
+
+    @classmethod
+    def from_stats(cls, current_stats):
+        """Create a result from a statistics dictionary.
+
+        Args:
+            current_stats (dict): Statistics dictionary of a file.
+
+        Returns:
+            CompressResult: Result record.
+        """
+        return cls(**{column: values[0] for column, values in current_stats.items()})
+
+    def to_stats(self):
+        """Get statistics dictionary of the result.
+
+        Returns:
+            dict: Statistics dictionary, with a list of one value by column.
+        """
+        return {column: [value] for column, value in asdict(self).items()}
+
+
+def get_config(config=None, compress_params=None):
+    """Get API config, from a config dictionary or the default config, with compression parameters overrides.
+
+    Args:
+        config (dict or None, optional): Config dictionary, default config if None. Defaults to None.
+        compress_params (dict or None, optional): Compression parameters by format, merged into config
+            compression parameters ({"JPEG": {"quality": 80}, ...}). Defaults to None.
+
+    Returns:
+        dict: Config dictionary.
+    """
+    config = copy.deepcopy(read_yml(str(PATH_DEFAULT_CONFIG)) if config is None else config)
+
+    for fmt, params in (compress_params or {}).items():
+        config["compress_params"].setdefault(fmt, {}).update(params)
+
+    return config
+
+
+def to_media_input(item):
+    """Convert an API input to a media input.
+
+    Args:
+        item (MediaInput or tuple): Media input, or (input path, output path) pair, or (input name, output path,
+            input data) with input data as bytes or a binary file object.
+
+    Returns:
+        MediaInput: Media input.
+    """
+    if not isinstance(item, MediaInput):
+        item = MediaInput(*item)
+
+    data = item.data
+
+    # binary file object, read in memory
+    if data is not None and not isinstance(data, bytes):
+        data = data.read()
+
+    return MediaInput(Path(item.path_in), Path(item.path_out), data, item.in_size)
+
+
+def check_output_path(path_in, path_out):
+    """Check that output extention has a registered output format written by the media class of the input.
+    Inputs of unknown format are copied with their own extention, their output extention is not checked.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+
+    Raises:
+        ValueError: Output extention has no registered output format for the input media.
+    """
+    media_class = get_input_media_class(path_in)
+
+    if media_class is None:
+        return
+
+    dtype_out = get_dtype(DataTypesOut, ext=path_out.suffix)
+
+    if dtype_out is None or dtype_out["fmt"] not in media_class.writers:
+        exts = [
+            get_dtype(DataTypesOut, fmt=fmt)["ext"] for fmt in get_formats(DataTypesOut) if fmt in media_class.writers
+        ]
+        raise ValueError(f"Invalid output extention of {path_in}. Expect one of {exts}, but found {path_out}.")
+
+
+def iter_media_jobs(inputs, path_spool):
+    """Convert API inputs to compression jobs, output directories are created.
+    Videos given in memory are written to a spool directory, since ffmpeg reads its inputs from files.
+
+    Args:
+        inputs (iterable): API inputs (see to_media_input).
+        path_spool (pathlib.Path): Spool directory path.
+
+    Raises:
+        ValueError: Output extention has no registered output format for the input media.
+
+    Yields:
+        tuple: Compression job (key, input path, output path, input size, input data), key is the input.
+    """
+    for idx, item in enumerate(inputs):
+        media_input = to_media_input(item)
+        path_in, data = media_input.path_in, media_input.data
+
+        check_output_path(path_in, media_input.path_out)
+        media_input.path_out.parent.mkdir(parents=True, exist_ok=True)
+
+        if data is not None:
+            media_class = get_input_media_class(path_in)
+
+            # spooled file keeps input name, so that copies keep it too
+            if media_class is not None and media_class.kind == "video":
+                path_in = path_spool / str(idx) / path_in.name
+                path_in.parent.mkdir()
+                path_in.write_bytes(data)
+                data = None
+
+        yield media_input, path_in, media_input.path_out, media_input.in_size, data
+
+
+def stream_compress(inputs, compress_params=None, config=None, workers=1, max_in_flight=None):
+    """Compress inputs and yield a result as soon as each input is done, in completion order.
+
+    Inputs are consumed lazily, so that at most max_in_flight inputs are read and not yet yielded
+    (backpressure). Closing the generator (break, close) cancels inputs waiting to be compressed,
+    inputs already being compressed are finished.
+
+    Args:
+        inputs (iterable): Inputs, each one is a MediaInput, an (input path, output path) pair, or an
+            (input name, output path, input data) tuple with input data as bytes or a binary file object.
+        compress_params (dict or None, optional): Compression parameters by format, merged into config
+            compression parameters ({"JPEG": {"quality": 80}, ...}). Defaults to None.
+        config (dict or None, optional): Config dictionary (see config.yml), default config if None. Defaults to None.
+        workers (int, optional): Number of CPU cores to use, 0 or lower uses all CPU cores. Defaults to 1.
+        max_in_flight (int or None, optional): Maximum number of inputs read and not yet yielded, 0 for no limit,
+            four times the number of workers if None. Defaults to None.
+
+    Raises:
+        KeyError: Invalid out dtype keys.
+        TypeError: Invalid output format.
+        ValueError: Invalid copy mode.
+        ValueError: Output extention has no registered output format for the input media, raised before
+            any compression for a list of inputs, when the input is taken for an iterator.
+
+    Yields:
+        CompressResult: Result record, input path is the input name for inputs given in memory.
+    """
+    config = get_config(config, compress_params)
+    check_config(config)
+
+    workers = get_workers(workers)
+    max_in_flight = 4 * workers if max_in_flight is None else max_in_flight
+
+    # lanes share cores budget when the number of jobs of each lane is known
+    n_image_jobs, n_video_jobs = None, None
+
+    # input data (file objects) is only read once the input is taken by the engine, output extentions
+    # of a list are checked before any compression, those of an iterator when each input is taken
+    if isinstance(inputs, (list, tuple)):
+        paths = [
+            (
+                (Path(item.path_in), Path(item.path_out))
+                if isinstance(item, MediaInput)
+                else (Path(item[0]), Path(item[1]))
+            )
+            for item in inputs
+        ]
+
+        for path_in, path_out in paths:
+            check_output_path(path_in, path_out)
+
+        image_jobs, video_jobs = split_jobs([path_in for path_in, _ in paths])
+        n_image_jobs, n_video_jobs = len(image_jobs), len(video_jobs)
+
+    path_spool = Path(tempfile.mkdtemp(prefix="mediaz_spool_"))
+
+    try:
+        for media_input, current_stats in iter_jobs(
+            iter_media_jobs(inputs, path_spool), config, workers, n_image_jobs, n_video_jobs, max_in_flight
+        ):
+            # spooled inputs are reported with their name
+            if media_input.data is not None:
+                current_stats["in_path"] = [str(media_input.path_in)]
+
+            yield CompressResult.from_stats(current_stats)
+
+    finally:
+        shutil.rmtree(path_spool, ignore_errors=True)
+
+
+async def astream_compress(inputs, compress_params=None, config=None, workers=1, max_in_flight=None):
+    """Asynchronous iterator version of stream_compress.
+    Compression runs in a background thread, the next result is only awaited when the consumer asks for it,
+    and cancelling the consumer (or closing the iterator) closes the underlying generator.
+
+    Args:
+        inputs (iterable): Inputs (see stream_compress).
+        compress_params (dict or None, optional): Compression parameters by format. Defaults to None.
+        config (dict or None, optional): Config dictionary, default config if None. Defaults to None.
+        workers (int, optional): Number of CPU cores to use, 0 or lower uses all CPU cores. Defaults to 1.
+        max_in_flight (int or None, optional): Maximum number of inputs read and not yet yielded, 0 for no limit,
+            four times the number of workers if None. Defaults to None.
+
+    Yields:
+        CompressResult: Result record.
+    """
+    # imported here, bulk compression (command line) does not need an event loop
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    generator = stream_compress(inputs, compress_params, config, workers, max_in_flight)
+
+    # a single thread, generator is never resumed concurrently
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            while True:
+                result = await loop.run_in_executor(executor, next, generator, None)
+
+                if result is None:
+                    return
+
+                yield result
+
+        finally:
+            await loop.run_in_executor(executor, generator.close)
+
+
+def bulk_compress(config, path_in, path_data, path_summary, no_progress_bar, index=None, shard=None):
+    """Compress all supported medias within an input directory.
+    Files already processed in the project with same content and config (see manifest) are skipped,
+    and their statistics are kept in the statistics file.
+
+    A shard only processes its partition of input files, and records its statistics and manifest in
+    its own files. Statistics file and verification are left to the merge of all shards.
+
+    Args:
+        config (dict): Config dictionary.
+        path_in (pathlib.Path): Input directory path.
+        path_data (pathlib.Path): Project data path.
+        path_summary (pathlib.Path): Project summary path.
+        no_progress_bar (bool): Enable or disable tqdm progress bar.
+        index (mediaz.walk.DirectoryIndex, optional): Input directory index, walked if None. Defaults to None.
+        shard (tuple or None, optional): Shard index and number of shards, all files are processed if None.
+            Defaults to None.
+
+    Raises:
+        KeyError: Invalid out dtype keys.
+        TypeError: Invalid output format.
+        ValueError: Invalid copy mode.
+    """
+    check_config(config)
+
+    if index is None:
+        index = index_directory(path_in, config.get("walk_workers", 1))
+
+    # get all input files and output files paths
+    path_in_files, path_out_files = get_files_paths(
+        path_in, path_data, config["out_dtype"], config["apply_snake_case"], index
+    )
+
+    # shard files are merged into project files by the merge step
+    shard_name = None if shard is None else get_shard_name(shard)
+    path_manifest = path_summary / ("manifest.jsonl" if shard is None else f"manifest_{shard_name}.jsonl")
+
+    # only process new or modified input files
+    manifest = read_manifest(path_summary / "manifest.jsonl")
+
+    if shard is not None:
+        manifest.update(read_manifest(path_manifest))
+
+    config_hash = get_config_hash(config)
+
+    jobs = [
+        idx
+        for idx, path_in_file in enumerate(path_in_files)
+        if in_shard(path_in_file, path_in, shard)
+        and not is_unchanged(
+            manifest.get(str(path_in_file)), index.get_size(path_in_file), index.get_mtime(path_in_file), config_hash
+        )
+    ]
+
+    if len(jobs) < len(path_in_files):
+        logger.info("Skipping %s unchanged files already processed.", len(path_in_files) - len(jobs))
+
+    # remove outputs of modified input files, output path can differ from the new one
+    for idx in jobs:
+        if str(path_in_files[idx]) in manifest:
+            Path(manifest[str(path_in_files[idx])]["out_path"]).unlink(missing_ok=True)
+
+    path_in_jobs = [path_in_files[idx] for idx in jobs]
+    path_out_jobs = [path_out_files[idx] for idx in jobs]
+    in_sizes = [index.get_size(path_in_files[idx]) for idx in jobs]
+
+    # each unique content is compressed once, duplicates outputs are copied from their canonical output
+    canonical_jobs = find_duplicates(path_in_jobs, in_sizes) if config.get("dedup", False) else {}
+    duplicates = defaultdict(list)
+
+    for idx, canonical_idx in canonical_jobs.items():
+        duplicates[canonical_idx].append(idx)
+
+    if len(canonical_jobs) > 0:
+        logger.info("Found %s duplicate files.", len(canonical_jobs))
+
+    unique_jobs = [idx for idx in range(len(path_in_jobs)) if idx not in canonical_jobs]
+
+    workers = get_workers(config.get("workers", 1))
+
+    logger.info("Starting compression on %s files with %s workers.", len(unique_jobs), workers)
+    start = time.time()
+
+    # imported here, progress bar is only needed by bulk compression
+    from tqdm import tqdm
+
+    inputs = [MediaInput(path_in_jobs[idx], path_out_jobs[idx], in_size=in_sizes[idx]) for idx in unique_jobs]
+    jobs_by_path = {str(path_in_jobs[idx]): idx for idx in unique_jobs}
+
+    # compression task, statistics are recorded on disk as soon as each file is done
+    with (
+        tqdm(total=len(path_in_jobs), disable=no_progress_bar) as progress_bar,
+        StatsRecorder(path_summary, "stats" if shard is None else f"stats_{shard_name}") as stats_recorder,
+        open(path_manifest, "a", encoding="utf-8") as f,
+    ):
+        for result in stream_compress(inputs, config=config, workers=workers, max_in_flight=0):
+            canonical_idx = jobs_by_path[result.in_path]
+            current_stats = result.to_stats()
+            results = [(canonical_idx, current_stats)]
+
+            for idx in duplicates.get(canonical_idx, []):
+                results.append(
+                    (idx, copy_duplicate(path_in_jobs[idx], path_out_jobs[idx], current_stats, config, in_sizes[idx]))
+                )
+
+            for idx, file_stats in results:
+                stats_recorder.record(file_stats)
+                progress_bar.update(1)
+
+                # record processed file as soon as it is done to resume an interrupted run
+                write_manifest_entry(
+                    f,
+                    path_in_jobs[idx],
+                    index.get_size(path_in_jobs[idx]),
+                    index.get_mtime(path_in_jobs[idx]),
+                    config_hash,
+                    file_stats,
+                )
+
+    logger.info("Task took %s minutes.", (time.time() - start) / 60)
+
+    # timings summary is built from the statistics log, rows are not kept in memory during compression
+    recorded = stats_recorder.read_recorded()
+
+    if len(recorded) > 0:
+        write_timings_summary(recorded, path_summary, logger, "timings" if shard is None else f"timings_{shard_name}")
+
+    if shard is not None:
+        logger.info("Shard %s done, merge shards once all shards are done.", shard_name)
+        return
+
+    logger.info("Writing statistics file.")
+    stats_recorder.write_stats(path_in_files)
+
+    verify_number_of_files(path_in, path_data, index)
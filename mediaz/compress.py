@@ -1,54 +1,99 @@
 """Compression functions."""
 
-import shutil
+import copy
+import io
+import itertools
+import os
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from pathlib import Path
 
-import pandas as pd
-from tqdm import tqdm
-
-from mediaz.dtype.dtype import get_media_obj
-from mediaz.dtype.dtype_support import DataTypesOut
-from mediaz.utils import get_files_paths, get_logger, rename_path, update_stats, verify_number_of_files
+from mediaz.dtype.dtype import get_dtype, get_formats, get_media_class, get_media_obj, get_registrations, register_all
+from mediaz.dtype.dtype_support import DataTypesIn, DataTypesOut
+from mediaz.filecopy import COPY_MODES, copy_file
+from mediaz.stats import TIMING_COLUMNS, init_stats
+from mediaz.utils import SpooledOutput, get_copy_path, get_logger, update_stats
 
 logger = get_logger(__name__)
 
 
-def copy_input(path_in, path_out, current_stats, apply_snake_case):
-    """Copy unrecognized input file.
+def copy_input(path_in, path_out, current_stats, status=0, copy_mode="copy", data=None):
+    """Copy unrecognized input file, or input file that is not predicted to benefit from compression.
 
     Args:
         path_in (pathlib.Path): Input file path.
         path_out (pathlib.Path): Output file path.
-        current_stats (pandas.Dataframe): Statistics dataframe.
-        apply_snake_case (bool): If true, rename files and directories to snake case standard.
+        current_stats (dict): Statistics dictionary.
+        status (int, optional): Status of the copy (0: unknown format, 4: skipped compression). Defaults to 0.
+        copy_mode (str, optional): Copy mode, see filecopy.copy_file. Defaults to "copy".
+        data (bytes or None, optional): Input file content if input only exists in memory. Defaults to None.
 
     Returns:
-        pandas.Dataframe: Statistics dataframe.
+        dict: Statistics dictionary of the copied file.
     """
-    logger.info("Copy file because of unknown input format: %s", path_in)
+    if status == 0:
+        logger.info("Copy file because of unknown input format: %s", path_in)
+    else:
+        logger.info("Copy file because compression is not predicted to reduce its size: %s", path_in)
 
     # copy input file as output file
-    path_out = path_out.parent / f"{path_in.stem}{path_in.suffix.lower()}"
+    path_out = get_copy_path(path_in, path_out)
+
+    start = time.perf_counter()
+    copy_method = copy_file(path_in, path_out, copy_mode, data)
+
+    # add output path, sizes, status and copy method, copied file has input file size
+    current_stats = update_stats(
+        current_stats,
+        {
+            "out_path": str(path_out),
+            "out_compressed_size": current_stats["in_size"][0],
+            "out_size": current_stats["in_size"][0],
+            "status": status,
+            "copy_method": copy_method,
+            "time_copy": time.perf_counter() - start,
+        },
+    )
+    return current_stats
+
 
-    if apply_snake_case:
-        path_out = rename_path(path_out, path_root=None)
+def copy_failed_input(path_in, path_out, config, current_stats, data=None):
+    """Copy input file of a recognized format whose compression failed.
 
-    shutil.copy2(path_in, path_out)
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+        config (dict): Config dictionary.
+        current_stats (dict): Statistics dictionary.
+        data (bytes or None, optional): Input file content if input only exists in memory. Defaults to None.
+
+    Returns:
+        dict: Statistics dictionary.
+    """
+    logger.error("Failed to compress file: %s, file will be copied.", path_in)
+
+    path_out = get_copy_path(path_in, path_out)
+
+    start = time.perf_counter()
+    copy_method = copy_file(path_in, path_out, config.get("copy_mode", "copy"), data)
 
-    # add output path, sizes and status
     current_stats = update_stats(
         current_stats,
         {
             "out_path": str(path_out),
-            "out_compressed_size": path_out.stat().st_size,
-            "out_size": path_out.stat().st_size,
-            "status": 0,
+            "out_compressed_size": current_stats["in_size"][0],
+            "out_size": current_stats["in_size"][0],
+            "status": 3,
+            "copy_method": copy_method,
+            "time_copy": time.perf_counter() - start,
         },
     )
     return current_stats
 
 
-def compress_input(path_in, path_out, media, config, current_stats, apply_snake_case):
+def compress_input(path_in, path_out, media, config, current_stats, data=None, defer_write=False, in_memory=False):
     """Compressed recognized input media file.
 
     Args:
@@ -56,28 +101,57 @@ def compress_input(path_in, path_out, media, config, current_stats, apply_snake_
         path_out (pathlib.Path): Output file path.
         media (ImageMedia or VideoMedia): Media object.
         config (dict): Config dictionary.
-        current_stats (pandas.Dataframe): Statistics dataframe.
-        apply_snake_case (bool): If true, rename files and directories to snake case standard.
+        current_stats (dict): Statistics dictionary.
+        data (bytes or None, optional): Input file data if already read in memory. Defaults to None.
+        defer_write (bool, optional): If true, compressed output kept in memory is returned instead of being
+            written. Defaults to False.
+        in_memory (bool, optional): If true, input only exists in memory (data), copies write it. Defaults to False.
 
     Returns:
-        pandas.Dataframe: Statistics dataframe.
+        dict: Statistics dictionary of the compressed file.
+        bytes or None: Compressed output data to write at output path, None if there is nothing left to write.
     """
+    output = None
+    output_data = None
+    copy_data = data if in_memory else None
+
     try:
-        media.read(str(path_in))
-        media.write(str(path_out), config["compress_params"])
+        start = time.perf_counter()
+        media.read(str(path_in) if data is None else io.BytesIO(data), config["compress_params"])
+        current_stats = update_stats(current_stats, {"time_read": time.perf_counter() - start})
+
+        # encode in memory to write output once, compressed file or input file
+        start = time.perf_counter()
+
+        if media.buffered:
+            output = SpooledOutput(path_out, config.get("max_buffer_size", 64 * 1024 * 1024))
+            media.write(output, config["compress_params"])
+            compressed_size = output.size
+
+        else:
+            media.write(str(path_out), config["compress_params"])
+            compressed_size = path_out.stat().st_size
+
+        # release decoded media buffers before copying or committing output
+        media.close()
+
+        # add media specific statistics, write time does not include conversion time measured by media
+        current_stats = update_stats(current_stats, media.stats)
+        time_write = time.perf_counter() - start - media.stats.get("time_convert", 0.0)
 
         # add output path, compressed size and status
         current_stats = update_stats(
             current_stats,
             {
                 "out_path": str(path_out),
-                "out_compressed_size": path_out.stat().st_size,
+                "out_compressed_size": compressed_size,
+                "out_size": compressed_size,
                 "status": 1,
             },
         )
 
         # compression has failed (larger outpur file size)
-        if path_in.stat().st_size < path_out.stat().st_size:
+        if current_stats["in_size"][0] < compressed_size:
             # replace compressed file by the original file
             if config["copy_if_larger"]:
                 logger.info(
@@ -86,100 +160,627 @@ def compress_input(path_in, path_out, media, config, current_stats, apply_snake_
                 )
 
                 # remove compressed file
-                path_out.unlink(missing_ok=False)
+                if output is None:
+                    path_out.unlink(missing_ok=False)
+                else:
+                    output.discard()
+                    output = None
 
                 # copy input file as output file
-                path_out = path_out.parent / f"{path_in.stem}{path_in.suffix.lower()}"
-
-                if apply_snake_case:
-                    path_out = rename_path(path_out, path_root=None)
-
-                shutil.copy2(path_in, path_out)
-
-                # update output path and status since it has changed
-                current_stats = update_stats(current_stats, {"out_path": str(path_out), "status": 2})
+                path_out = get_copy_path(path_in, path_out)
+
+                start = time.perf_counter()
+                copy_method = copy_file(path_in, path_out, config.get("copy_mode", "copy"), copy_data)
+
+                # update output path, size, status and copy method since it has changed
+                current_stats = update_stats(
+                    current_stats,
+                    {
+                        "out_path": str(path_out),
+                        "out_size": current_stats["in_size"][0],
+                        "status": 2,
+                        "copy_method": copy_method,
+                        "time_copy": time.perf_counter() - start,
+                    },
+                )
 
             # keep compressed file as output file
             else:
                 logger.info("Compressed file larger than original: %s", str(path_in))
 
-        # add final output file size in stats
-        current_stats = update_stats(current_stats, {"out_size": path_out.stat().st_size})
+        # output kept in memory is written later by the writer stage
+        if output is not None and defer_write and output.in_memory():
+            output_data = output.getvalue()
+
+        elif output is not None:
+            start = time.perf_counter()
+            output.commit()
+            time_write += time.perf_counter() - start
+
+        current_stats = update_stats(current_stats, {"time_write": time_write})
 
     except Exception:
-        logger.error("Failed to compress file: %s, file will be copied.", path_in)
+        media.close()
 
-        path_out = path_out.parent / f"{path_in.stem}{path_in.suffix.lower()}"
+        # remove partial output
+        if output is not None:
+            output.discard()
+        else:
+            path_out.unlink(missing_ok=True)
 
-        if apply_snake_case:
-            path_out = rename_path(path_out, path_root=None)
+        output_data = None
+        current_stats = copy_failed_input(path_in, path_out, config, current_stats, copy_data)
 
-        shutil.copy2(path_in, path_out)
+    return current_stats, output_data
 
-        current_stats = update_stats(
-            current_stats,
-            {
-                "out_path": str(path_out),
-                "out_compressed_size": path_out.stat().st_size,
-                "out_size": path_out.stat().st_size,
-                "status": 3,
-            },
-        )
 
-    return current_stats
+def predict_compressible(path_in, in_size, media, config, data=None):
+    """Predict if an input file benefits from compression.
+    Prediction is only used when larger compressed files are replaced by input files (copy_if_larger).
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        in_size (int): Input file size.
+        media (ImageMedia or VideoMedia): Media object.
+        config (dict): Config dictionary.
+        data (bytes or None, optional): Input file data if already read in memory. Defaults to None.
 
+    Returns:
+        bool: True if input file should be compressed.
+    """
+    skip_params = config.get("skip_prediction", {"enabled": False})
 
-def compress(path_in, path_out, config, stats):
-    """Compress a supported media file.
+    if not skip_params["enabled"] or not config["copy_if_larger"]:
+        return True
+
+    # unreadable header, let compression handle the failure
+    try:
+        source = str(path_in) if data is None else io.BytesIO(data)
+        return media.predict_compressible(source, in_size, config["compress_params"], skip_params)
+    except Exception:
+        return True
+
+
+def encode(path_in, path_out, config, in_size=None, data=None, defer_write=False, in_memory=False):
+    """Compress a supported media file, from its path or from its data already read in memory.
 
     Args:
         path_in (pathlib.Path): Input file path.
         path_out (pathlib.Path): Output file path.
         config (dict): Config dictionary.
-        stats (pandas.Dataframe): Statistics dataframe.
+        in_size (int or None, optional): Input file size if already known, else it is read. Defaults to None.
+        data (bytes or None, optional): Input file data if already read in memory. Defaults to None.
+        defer_write (bool, optional): If true, compressed output kept in memory is returned instead of being
+            written. Defaults to False.
+        in_memory (bool, optional): If true, input only exists in memory (data), path_in only gives its name and
+            format, and copies write data. Defaults to False.
 
     Returns:
-        pandas.Dataframe: Updated statistics dataframe.
+        dict: Statistics dictionary of the compressed file.
+        bytes or None: Compressed output data to write at output path, None if there is nothing left to write.
     """
-    current_stats = {
-        "in_path": [],
-        "in_size": [],
-        "out_path": [],
-        "out_compressed_size": [],
-        "out_size": [],
-        "status": [],
-    }
+    logger.info("Compressing file: %s", str(path_in))
+
+    current_stats = init_stats()
+
+    # input metadata time: size, data type and header prediction
+    start = time.perf_counter()
 
     # add input path and size values to statistics
-    current_stats = update_stats(current_stats, {"in_path": str(path_in), "in_size": path_in.stat().st_size})
+    if in_size is None:
+        in_size = len(data) if in_memory else path_in.stat().st_size
+
+    current_stats = update_stats(current_stats, {"in_path": str(path_in), "in_size": in_size})
+    copy_data = data if in_memory else None
 
     # get the right media object based on input dtype
     media = get_media_obj(path_in, path_out)
+    compressible = media is not None and predict_compressible(path_in, in_size, media, config, data)
+
+    current_stats = update_stats(current_stats, {"time_stat": time.perf_counter() - start})
 
     # unknown input dtype, we copy the input file to output directory
     if media is None:
-        current_stats = copy_input(path_in, path_out, current_stats, config["apply_snake_case"])
+        current_stats = copy_input(path_in, path_out, current_stats, 0, config.get("copy_mode", "copy"), copy_data)
+
+    # compression is not predicted to reduce size, input file would replace compressed file anyway
+    elif not compressible:
+        current_stats = copy_input(path_in, path_out, current_stats, 4, config.get("copy_mode", "copy"), copy_data)
 
     # read, compress and write
     else:
-        current_stats = compress_input(path_in, path_out, media, config, current_stats, config["apply_snake_case"])
+        return compress_input(path_in, path_out, media, config, current_stats, data, defer_write, in_memory)
+
+    return current_stats, None
+
 
-    return pd.concat((stats, pd.DataFrame(data=current_stats)), ignore_index=True)
+def compress(path_in, path_out, config, in_size=None):
+    """Compress a supported media file.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+        config (dict): Config dictionary.
+        in_size (int or None, optional): Input file size if already known, else it is read. Defaults to None.
 
+    Returns:
+        dict: Statistics dictionary of the compressed file.
+    """
+    current_stats, _ = encode(path_in, path_out, config, in_size)
+    return current_stats
 
-def bulk_compress(config, path_in, path_data, path_summary, no_progress_bar):
-    """Compress all supported medias within an input directory.
+
+def copy_duplicate(path_in, path_out, canonical_stats, config, in_size=None):
+    """Materialize the output of a duplicate input file from the output of its canonical input file.
+    Output extention follows the canonical output, a compressed file or a copy of the input file.
+    The duplicate is compressed on its own if canonical output can't be copied.
+
+    Args:
+        path_in (pathlib.Path): Duplicate input file path.
+        path_out (pathlib.Path): Duplicate output file path.
+        canonical_stats (dict): Statistics dictionary of the canonical input file.
+        config (dict): Config dictionary.
+        in_size (int or None, optional): Input file size if already known, else it is read. Defaults to None.
+
+    Returns:
+        dict: Statistics dictionary of the duplicate file.
+    """
+    logger.info("Copy output of duplicate file: %s, duplicate of: %s", path_in, canonical_stats["in_path"][0])
+
+    # canonical input file has been copied as output file
+    if canonical_stats["status"][0] != 1:
+        path_out = get_copy_path(path_in, path_out)
+
+    current_stats = {column: list(values) for column, values in canonical_stats.items()}
+    current_stats = update_stats(current_stats, {column: None for column in TIMING_COLUMNS})
+
+    try:
+        start = time.perf_counter()
+        copy_method = copy_file(Path(canonical_stats["out_path"][0]), path_out, config.get("copy_mode", "copy"))
+
+    except OSError:
+        logger.error("Failed to copy output of duplicate file: %s, file will be compressed.", path_in)
+        return compress(path_in, path_out, config, in_size)
+
+    return update_stats(
+        current_stats,
+        {
+            "in_path": str(path_in),
+            "out_path": str(path_out),
+            "status": 5,
+            "copy_method": copy_method,
+            "time_copy": time.perf_counter() - start,
+            "duplicate_of": canonical_stats["in_path"][0],
+        },
+    )
+
+
+def read_input(path_in):
+    """Read an input file in memory (prefetch stage).
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+
+    Returns:
+        bytes: Input file data.
+    """
+    return path_in.read_bytes()
+
+
+def write_output(path_in, output_data, config, current_stats, data=None):
+    """Write compressed output data to output path of statistics (writer stage).
+    Input file is copied if writing fails.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        output_data (bytes): Compressed output data.
+        config (dict): Config dictionary.
+        current_stats (dict): Statistics dictionary of the compressed file.
+        data (bytes or None, optional): Input file content if input only exists in memory. Defaults to None.
+
+    Returns:
+        dict: Statistics dictionary of the compressed file.
+    """
+    path_out = Path(current_stats["out_path"][0])
+    start = time.perf_counter()
+
+    try:
+        with open(path_out, "wb") as f:
+            f.write(output_data)
+
+    except Exception:
+        path_out.unlink(missing_ok=True)
+        return copy_failed_input(path_in, path_out, config, current_stats, data)
+
+    return update_stats(current_stats, {"time_write": current_stats["time_write"][0] + time.perf_counter() - start})
+
+
+def estimate_memory(path_in, path_out, config, in_size=None, data=None):
+    """Estimate peak memory used to compress a file, from its header only.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+        config (dict): Config dictionary.
+        in_size (int or None, optional): Input file size if already known, else it is read. Defaults to None.
+        data (bytes or None, optional): Input file data if already read in memory. Defaults to None.
+
+    Returns:
+        int: Estimated peak memory in bytes, 0 for unknown formats or unreadable headers.
+    """
+    media = get_media_obj(path_in, path_out)
+
+    if media is None:
+        return 0
+
+    if in_size is None:
+        in_size = path_in.stat().st_size
+
+    # unreadable header, compression handles the failure
+    try:
+        source = str(path_in) if data is None else io.BytesIO(data)
+        return media.estimate_memory(source, in_size, config["compress_params"])
+    except Exception:
+        return 0
+
+
+def get_workers(workers):
+    """Get the number of worker processes to use.
+
+    Args:
+        workers (int): Requested number of workers, 0 or lower uses all available CPU cores.
+
+    Returns:
+        int: Number of worker processes.
+    """
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def get_input_media_class(path_in):
+    """Get the media class handling an input file from its extention.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+
+    Returns:
+        type or None: Media class or None if input format is unknown.
+    """
+    dtype = get_dtype(DataTypesIn, ext=path_in.suffix)
+    return None if dtype is None else get_media_class(dtype["category"])
+
+
+def split_jobs(path_in_files):
+    """Split files into an image lane and a video lane based on input data type media kind.
+    Unknown formats are only copied, they are sent to the image lane.
+
+    Args:
+        path_in_files (list): List of input files paths.
+
+    Returns:
+        list: Indices of files processed by the image lane.
+        list: Indices of files processed by the video lane.
+    """
+    image_jobs, video_jobs = [], []
+
+    for idx, path_in_file in enumerate(path_in_files):
+        media_class = get_input_media_class(path_in_file)
+
+        if media_class is not None and media_class.kind == "video":
+            video_jobs.append(idx)
+        else:
+            image_jobs.append(idx)
+
+    return image_jobs, video_jobs
+
+
+def get_lanes_budget(cores, video_workers, video_threads, n_image_jobs, n_video_jobs):
+    """Share a CPU cores budget between the image lane and the video lane.
+    An image job uses a single core while a video job uses video_threads cores (ffmpeg threads).
+    When both lanes have jobs and video_threads is 0, half of the cores are given to the video lane.
+    Image lane uses all cores once the video lane is empty.
+
+    Args:
+        cores (int): Number of CPU cores to use.
+        video_workers (int): Maximum number of concurrent video jobs.
+        video_threads (int): Number of threads per video job, 0 to derive it from cores budget.
+        n_image_jobs (int): Number of image lane jobs.
+        n_video_jobs (int): Number of video lane jobs.
+
+    Returns:
+        int: Number of image lane workers while video_workers video jobs run.
+        int: Number of video lane workers.
+        int: Number of threads per video job.
+    """
+    video_workers = max(1, min(video_workers, n_video_jobs, cores))
+
+    # only images (or copies), all cores go to the image lane
+    if n_video_jobs == 0:
+        return cores, 0, 0
+
+    # only videos, all cores go to the video lane
+    if n_image_jobs == 0:
+        return 0, video_workers, video_threads if video_threads > 0 else max(1, cores // video_workers)
+
+    if video_threads <= 0:
+        video_threads = max(1, (cores // 2) // video_workers)
+
+    # image jobs wait for video jobs if video lane uses all cores
+    image_workers = max(0, cores - video_workers * video_threads)
+
+    return image_workers, video_workers, video_threads
+
+
+def iter_jobs(jobs, config, workers, n_image_jobs=None, n_video_jobs=None, max_in_flight=0):
+    """Compress jobs and yield their statistics as soon as each job is done.
+
+    Each file is an independent job since output paths are precomputed, so jobs can be
+    dispatched to a process pool of one process by core. Image and video jobs run in separate lanes
+    with their own concurrency so that ffmpeg threads and image workers share the cores budget:
+    at most video_workers video jobs run at once, and image jobs are admitted on cores left by
+    running video jobs (all cores once video lane is empty). Results are yielded in completion order.
+
+    Jobs are taken lazily from the jobs iterable, at most max_in_flight jobs are taken and not yet yielded.
+    When the generator is closed, jobs waiting in process pools are cancelled, running jobs are finished.
+
+    If memory_budget_mb is set, image jobs are admitted one by one while the estimated peak memory
+    of in flight image jobs fits the budget. A job is always admitted if no image job is in flight.
+
+    If prefetch_mb is set, image lane runs as a pipeline so that I/O and compute overlap:
+    prefetch threads read upcoming images in memory within the prefetch budget, image workers
+    decode and encode from memory, and a writer thread writes compressed outputs. Outputs waiting
+    for the writer are charged to the prefetch budget, so that reads wait for a slow disk.
+
+    Args:
+        jobs (iterable): Jobs (key, input path, output path, input size or None, input data or None). Input data is
+            given when input only exists in memory, input path then only gives its name and format.
+        config (dict): Config dictionary.
+        workers (int): Number of CPU cores to use.
+        n_image_jobs (int or None, optional): Number of image lane jobs, if known. Defaults to None.
+        n_video_jobs (int or None, optional): Number of video lane jobs, if known. Defaults to None.
+        max_in_flight (int, optional): Maximum number of jobs taken and not yet yielded, 0 for no limit.
+            Defaults to 0.
+
+    Yields:
+        any: Job key.
+        dict: Statistics dictionary of the compressed file.
+    """
+    jobs = iter(jobs)
+
+    memory_budget = config.get("memory_budget_mb", 0) * 1024**2
+    prefetch_budget = config.get("prefetch_mb", 0) * 1024**2
+    prefetch_threads = max(1, config.get("prefetch_threads", 4))
+
+    # serial execution in the current process
+    if workers == 1 and prefetch_budget <= 0:
+        for key, path_in, path_out, in_size, data in jobs:
+            current_stats, _ = encode(path_in, path_out, config, in_size, data, in_memory=data is not None)
+            yield key, current_stats
+        return
+
+    # unknown numbers of jobs, budget is shared as if both lanes had jobs
+    image_workers, video_workers, video_threads = get_lanes_budget(
+        workers,
+        config.get("video_workers", 1),
+        config.get("video_threads", 0),
+        1 if n_image_jobs is None else n_image_jobs,
+        config.get("video_workers", 1) if n_video_jobs is None else n_video_jobs,
+    )
+
+    if n_image_jobs is not None and n_video_jobs is not None:
+        logger.info(
+            "Image lane: %s jobs on %s workers, %s workers while video jobs run. "
+            "Video lane: %s jobs on %s workers with %s threads each.",
+            n_image_jobs,
+            workers,
+            image_workers,
+            n_video_jobs,
+            video_workers,
+            video_threads,
+        )
+
+    # give an explicit threads budget to each ffmpeg invocation
+    video_config = copy.deepcopy(config)
+    video_config["compress_params"]["MP4"]["threads"] = video_threads
+
+    # taken jobs by job id: key, input path, output path, input size and input data
+    taken = {}
+    job_ids = itertools.count()
+    exhausted = False
+
+    # compression jobs, prefetch jobs and writer stage jobs, by future
+    futures = {}
+    reads = {}
+    writes = {}
+
+    # video jobs waiting for admission, and running video jobs
+    pending_videos = deque()
+    videos = set()
+
+    # image jobs waiting to be prefetched, and prefetched jobs waiting for admission
+    pending_jobs = deque()
+    ready_jobs = deque()
+
+    # bytes held in memory by job (prefetched input, then output waiting for the writer),
+    # and estimated memory of in flight image jobs (one entry by image job)
+    prefetched = {}
+    memory = {}
+
+    with ExitStack() as stack:
+        executors = {}
+
+        def get_executor(name):
+            # executors are started with their first job, lanes share the compression pool, workers get
+            # runtime registrations of formats and media functions (not inherited with spawn or forkserver)
+            if name not in executors:
+                if name == "compress":
+                    executors[name] = stack.enter_context(
+                        ProcessPoolExecutor(
+                            max_workers=workers, initializer=register_all, initargs=(get_registrations(),)
+                        )
+                    )
+                elif name == "read":
+                    executors[name] = stack.enter_context(ThreadPoolExecutor(max_workers=prefetch_threads))
+                else:
+                    executors[name] = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+
+            return executors[name]
+
+        try:
+            while True:
+                # intake stage, jobs wait for their lane
+                while not exhausted and (max_in_flight <= 0 or len(taken) < max_in_flight):
+                    try:
+                        job = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+
+                    job_id = next(job_ids)
+                    taken[job_id] = job
+                    _, path_in, path_out, in_size, data = job
+                    media_class = get_input_media_class(path_in)
+
+                    if media_class is not None and media_class.kind == "video":
+                        pending_videos.append(job_id)
+                    else:
+                        pending_jobs.append(job_id)
+
+                if len(taken) == 0:
+                    break
+
+                # video lane, video jobs are admitted first since they are the longest
+                while len(pending_videos) > 0 and len(videos) < video_workers:
+                    job_id = pending_videos.popleft()
+                    _, path_in, path_out, in_size, data = taken[job_id]
+                    future = get_executor("compress").submit(
+                        encode, path_in, path_out, video_config, in_size, data, False, data is not None
+                    )
+                    futures[future] = job_id
+                    videos.add(future)
+
+                # prefetch stage, only images are read in memory (videos and copies do not benefit from it)
+                while len(pending_jobs) > 0:
+                    job_id = pending_jobs[0]
+                    _, path_in, _, in_size, data = taken[job_id]
+                    media_class = get_input_media_class(path_in)
+
+                    # input already in memory
+                    if prefetch_budget <= 0 or media_class is None or not media_class.buffered or data is not None:
+                        ready_jobs.append((pending_jobs.popleft(), data))
+                        continue
+
+                    if len(reads) >= prefetch_threads:
+                        break
+
+                    size = in_size if in_size is not None else path_in.stat().st_size
+
+                    if len(prefetched) > 0 and sum(prefetched.values()) + size > prefetch_budget:
+                        break
+
+                    pending_jobs.popleft()
+                    prefetched[job_id] = size
+                    reads[get_executor("read").submit(read_input, path_in)] = job_id
+
+                # compression stage, image lane uses cores left by running video jobs
+                image_slots = workers - len(videos) * video_threads
+
+                while len(ready_jobs) > 0:
+                    job_id, data = ready_jobs[0]
+                    _, path_in, path_out, in_size, input_data = taken[job_id]
+                    job_memory = 0
+
+                    if len(memory) >= image_slots:
+                        break
+
+                    if memory_budget > 0:
+                        job_memory = estimate_memory(path_in, path_out, config, in_size, data)
+
+                        if len(memory) > 0 and sum(memory.values()) + job_memory > memory_budget:
+                            break
+
+                    ready_jobs.popleft()
+                    future = get_executor("compress").submit(
+                        encode, path_in, path_out, config, in_size, data, prefetch_budget > 0, input_data is not None
+                    )
+                    futures[future] = job_id
+                    memory[future] = job_memory
+
+                done, _ = wait([*reads, *futures, *writes], return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in reads:
+                        job_id = reads.pop(future)
+
+                        # unreadable file, compression reads it again from its path and handles the failure
+                        try:
+                            ready_jobs.append((job_id, future.result()))
+                        except OSError:
+                            ready_jobs.append((job_id, None))
+
+                    elif future in writes:
+                        job_id = writes.pop(future)
+                        prefetched.pop(job_id, None)
+                        yield taken.pop(job_id)[0], future.result()
+
+                    else:
+                        job_id = futures.pop(future)
+                        videos.discard(future)
+                        memory.pop(future, None)
+                        current_stats, output_data = future.result()
+
+                        if output_data is None:
+                            prefetched.pop(job_id, None)
+                            yield taken.pop(job_id)[0], current_stats
+                        else:
+                            # output waits in memory for the writer, it is charged to the prefetch budget until written
+                            prefetched[job_id] = len(output_data)
+                            _, path_in, _, _, input_data = taken[job_id]
+                            write = get_executor("write").submit(
+                                write_output, path_in, output_data, config, current_stats, input_data
+                            )
+                            writes[write] = job_id
+
+        # closed generator or failure, jobs not started yet are cancelled
+        finally:
+            for future in [*reads, *futures, *writes]:
+                future.cancel()
+
+
+def iter_compress(path_in_files, path_out_files, config, workers, in_sizes=None):
+    """Compress files and yield their statistics as soon as each file is done (see iter_jobs).
+
+    Args:
+        path_in_files (list): List of input files paths.
+        path_out_files (list): List of output files paths.
+        config (dict): Config dictionary.
+        workers (int): Number of CPU cores to use.
+        in_sizes (list or None, optional): List of input files sizes if already known. Defaults to None.
+
+    Yields:
+        int: Index of the file in input files list.
+        dict: Statistics dictionary of the compressed file.
+    """
+    if in_sizes is None:
+        in_sizes = [None] * len(path_in_files)
+
+    image_jobs, video_jobs = split_jobs(path_in_files)
+    jobs = [(idx, path_in_files[idx], path_out_files[idx], in_sizes[idx], None) for idx in range(len(path_in_files))]
+
+    yield from iter_jobs(jobs, config, workers, len(image_jobs), len(video_jobs))
+
+
+def check_config(config):
+    """Check output formats and copy mode of the config.
 
     Args:
         config (dict): Config dictionary.
-        path_in (pathlib.Path): Input directory path.
-        path_data (pathlib.Path): Project data path.
-        path_summary (pathlib.Path): Project summary path.
-        no_progress_bar (bool): Enable or disable tqdm progress bar.
 
     Raises:
         KeyError: Invalid out dtype keys.
         TypeError: Invalid output format.
+        ValueError: Invalid copy mode.
     """
     # check type of medias keys in output format dict
     expected_keys = ["image", "video"]
@@ -188,35 +789,9 @@ def bulk_compress(config, path_in, path_data, path_summary, no_progress_bar):
 
     # check that each ouput format is allowed
     for _, dtype in config["out_dtype"].items():
-        if dtype["fmt"] not in DataTypesOut.keys():
-            raise TypeError(f"Invalid output format. Available output formats: {list(DataTypesOut.keys())}")
-
-    # get all input files and output files paths
-    path_in_files, path_out_files = get_files_paths(path_in, path_data, config["out_dtype"], config["apply_snake_case"])
-
-    stats = pd.DataFrame(
-        data={
-            "in_path": [],
-            "in_size": [],
-            "out_path": [],
-            "out_compressed_size": [],
-            "out_size": [],
-            "status": [],
-        }
-    )
-
-    logger.info("Starting compression on %s files.", len(path_in_files))
-    start = time.time()
-
-    # compression task
-    for idx, path_in_file in enumerate(tqdm(path_in_files, disable=no_progress_bar)):
-        logger.info("Compressing file: %s", str(path_in_file))
-        stats = compress(path_in_file, path_out_files[idx], config, stats)
-
-    logger.info("Task took %s minutes.", (time.time() - start) / 60)
-
-    logger.info("Writing statistics file.")
-    path_stats = path_summary / "stats.json"
-    stats.to_json(str(path_stats))
+        if dtype["fmt"] not in get_formats(DataTypesOut):
+            raise TypeError(f"Invalid output format. Available output formats: {get_formats(DataTypesOut)}")
 
-    verify_number_of_files(path_in, path_data)
+    # check that copy mode is allowed
+    if config.get("copy_mode", "copy") not in COPY_MODES:
+        raise ValueError(f"Invalid copy mode. Expect one of {COPY_MODES}, but found {config['copy_mode']}.")
@@ -0,0 +1,96 @@
+"""Input files deduplication functions."""
+
+import hashlib
+from collections import defaultdict
+
+# size of the file head hashed first, files only differing after it are rare
+HEAD_SIZE = 64 * 1024
+
+# read size while hashing whole files
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path, size=None):
+    """Hash file content with BLAKE2b.
+
+    Args:
+        path (pathlib.Path): File path.
+        size (int or None, optional): Number of bytes hashed from file start, whole file if None. Defaults to None.
+
+    Returns:
+        bytes: File content digest.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    remaining = size
+
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+
+            if not chunk:
+                break
+
+            digest.update(chunk)
+
+            if remaining is not None:
+                remaining -= len(chunk)
+
+    return digest.digest()
+
+
+def group_by_hash(path_in_files, indices, size=None):
+    """Group files by content hash, unreadable files are left out.
+
+    Args:
+        path_in_files (list): List of input files paths.
+        indices (list): Indices of the files to group.
+        size (int or None, optional): Number of bytes hashed from file start, whole file if None. Defaults to None.
+
+    Returns:
+        list: Groups of at least two files indices with the same hash, in input order.
+    """
+    groups = defaultdict(list)
+
+    for idx in indices:
+        try:
+            groups[hash_file(path_in_files[idx], size)].append(idx)
+        except OSError:
+            continue
+
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def find_duplicates(path_in_files, in_sizes):
+    """Find input files with identical content.
+    Files are grouped by size first, then by hash of their head, and only then by hash of their whole content,
+    so that most files are never read. The first file of a group is its canonical file.
+
+    Args:
+        path_in_files (list): List of input files paths.
+        in_sizes (list): List of input files sizes.
+
+    Returns:
+        dict: Index of canonical file by index of duplicate file.
+    """
+    by_size = defaultdict(list)
+
+    # empty files are not worth deduplicating
+    for idx, size in enumerate(in_sizes):
+        if size > 0:
+            by_size[size].append(idx)
+
+    duplicates = {}
+
+    for size, indices in by_size.items():
+        if len(indices) < 2:
+            continue
+
+        for group in group_by_hash(path_in_files, indices, HEAD_SIZE):
+            # head is the whole file content
+            groups = [group] if size <= HEAD_SIZE else group_by_hash(path_in_files, group)
+
+            for group_files in groups:
+                for idx in group_files[1:]:
+                    duplicates[idx] = group_files[0]
+
+    return duplicates
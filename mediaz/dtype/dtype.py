@@ -1,8 +1,132 @@
 """Data types functions."""
 
+import copy
+import importlib
+import sys
+
 from mediaz.dtype.dtype_support import DataTypesIn, DataTypesOut
-from mediaz.mtype.image_media import ImageMedia
-from mediaz.mtype.video_media import VideoMedia
+
+# data types registries by Enum, built once from supported data types Enums:
+# {enum: {"fmt": {fmt: data type dict}, "ext": {ext: data type dict}}}
+__registry = {DataTypesIn: {"fmt": {}, "ext": {}}, DataTypesOut: {"fmt": {}, "ext": {}}}
+
+# media class or its import path "module:class" by input data type category,
+# import paths are resolved on first use so that media dependencies are only imported when needed
+__media_classes = {}
+
+
+def register_dtype(enum, category, fmt, ext, overwrite=True):
+    """Register a data type, it can then be resolved from its format or extention.
+
+    Args:
+        enum (enum.Enum): Datatype Enum (DataTypesIn or DataTypesOut).
+        category (str): Data type category name (IMAGE_PIL, VIDEO_MP4, ...).
+        fmt (str): Format string.
+        ext (list or str): List of extentions for input data types, extention for output data types.
+        overwrite (bool, optional): If false, already registered format or extention are kept. Defaults to True.
+
+    Raises:
+        KeyError: Unknown Enum.
+    """
+    if enum not in __registry:
+        raise KeyError(f"Unknown Enum. Expect one of {list(__registry.keys())}, but found {enum}.")
+
+    registry = __registry[enum]
+    exts = [ext] if isinstance(ext, str) else ext
+
+    if overwrite or fmt not in registry["fmt"]:
+        registry["fmt"][fmt] = {"category": category, "fmt": fmt, "ext": ext}
+
+    for dtype_ext in exts:
+        if overwrite or dtype_ext.lower() not in registry["ext"]:
+            registry["ext"][dtype_ext.lower()] = {"category": category, "fmt": fmt}
+
+
+def register_media(category, media_class):
+    """Register the media class handling an input data type category.
+
+    Args:
+        category (str): Input data type category name.
+        media_class (type or str): Media class, subclass of AbstractMedia, or its import path "module:class"
+            imported on first use.
+    """
+    __media_classes[category] = media_class
+
+
+def get_media_class(category):
+    """Get the media class handling an input data type category, its module is imported on first use.
+
+    Args:
+        category (str): Input data type category name.
+
+    Returns:
+        type or None: Media class or None if category is unknown.
+    """
+    media_class = __media_classes.get(category)
+
+    if isinstance(media_class, str):
+        module_name, class_name = media_class.split(":")
+        media_class = getattr(importlib.import_module(module_name), class_name)
+        __media_classes[category] = media_class
+
+    return media_class
+
+
+def get_formats(enum):
+    """Get all registered formats.
+
+    Args:
+        enum (enum.Enum): Datatype Enum.
+
+    Returns:
+        list: List of formats strings.
+    """
+    return list(__registry[enum]["fmt"].keys())
+
+
+def get_registrations():
+    """Get registered data types, media classes and functions registered on media classes, so that process
+    pool workers started with spawn or forkserver (which only import modules) get runtime registrations too.
+
+    Returns:
+        dict: Registrations, picklable if registered classes and functions are defined at module level.
+    """
+    media_classes = dict(__media_classes)
+
+    # media class imported by the caller (to register a reader or a writer) but not yet resolved
+    for category, media_class in media_classes.items():
+        if isinstance(media_class, str) and media_class.split(":")[0] in sys.modules:
+            media_classes[category] = get_media_class(category)
+
+    functions = {
+        media_class: media_class.registered
+        for media_class in set(media_classes.values())
+        if not isinstance(media_class, str) and len(media_class.registered) > 0
+    }
+    return {"registry": copy.deepcopy(__registry), "media_classes": media_classes, "functions": functions}
+
+
+def register_all(registrations):
+    """Register registrations of another process (see get_registrations), used as process pool initializer.
+
+    Args:
+        registrations (dict): Registrations.
+    """
+    for enum, registry in registrations["registry"].items():
+        __registry[enum] = registry
+
+    __media_classes.update(registrations["media_classes"])
+
+    for media_class, registered in registrations["functions"].items():
+        # already registered in this process (fork), functions are not registered twice
+        if registered == media_class.registered:
+            continue
+
+        for kind, key, function in registered:
+            if kind == "reader":
+                media_class.register_reader(key, function)
+            else:
+                media_class.register_writer(key, function)
 
 
 def get_dtype_from_fmt(enum, fmt):
@@ -15,11 +139,11 @@ def get_dtype_from_fmt(enum, fmt):
     Returns:
         dict or None: Return Enum data type dict if fmt is matched, else None.
     """
-    for category in enum:
-        for dtypes_fmt, dtypes_ext in category.value.items():
-            if fmt == dtypes_fmt:
-                return {"category": category.name, "fmt": fmt, "ext": dtypes_ext}
-    return None
+    dtype = __registry[enum]["fmt"].get(fmt)
+
+    if dtype is None:
+        return None
+    return dict(dtype)
 
 
 def get_dtype_from_ext(enum, ext):
@@ -32,11 +156,11 @@ def get_dtype_from_ext(enum, ext):
     Returns:
         dict or None: Return Enum data type dict if ext is matched, else None.
     """
-    for category in enum:
-        for dtypes_fmt, dtypes_ext in category.value.items():
-            if ext.lower() in dtypes_ext:
-                return {"category": category.name, "fmt": dtypes_fmt, "ext": ext.lower()}
-    return None
+    dtype = __registry[enum]["ext"].get(ext.lower())
+
+    if dtype is None:
+        return None
+    return {"category": dtype["category"], "fmt": dtype["fmt"], "ext": ext.lower()}
 
 
 def get_dtype(enum, fmt=None, ext=None):
@@ -78,17 +202,33 @@ def get_media_obj(path_in, path_out):
         ImageMedia or VideoMedia or None: None or appropriate media object.
     """
     # get data type from file extention
-    dtype_in = get_dtype(DataTypesIn, ext=path_in.suffix.lower())
-    dtype_out = get_dtype(DataTypesOut, ext=path_out.suffix.lower())
+    dtype_in = get_dtype(DataTypesIn, ext=path_in.suffix)
 
     # unknown data type
     if dtype_in is None:
         return None
 
-    # image file
-    elif dtype_in["category"] in [DataTypesIn.IMAGE_PIL.name, DataTypesIn.IMAGE_RAW.name]:
-        return ImageMedia(dtype_in, dtype_out)
+    media_class = get_media_class(dtype_in["category"])
+
+    # data type without media class to handle it
+    if media_class is None:
+        return None
+
+    return media_class(dtype_in, get_dtype(DataTypesOut, ext=path_out.suffix))
+
+
+def register_supported_dtypes():
+    """Register data types of supported data types Enums and their media classes.
+    First matching data type is kept when an extention is listed several times in Enums.
+    """
+    for enum in (DataTypesIn, DataTypesOut):
+        for category in enum:
+            for fmt, ext in category.value.items():
+                register_dtype(enum, category.name, fmt, ext, overwrite=False)
+
+    register_media(DataTypesIn.IMAGE_PIL.name, "mediaz.mtype.image_media:ImageMedia")
+    register_media(DataTypesIn.IMAGE_RAW.name, "mediaz.mtype.image_media:ImageMedia")
+    register_media(DataTypesIn.VIDEO_FFMPEG.name, "mediaz.mtype.video_media:VideoMedia")
+
 
-    # video file
-    else:
-        return VideoMedia(dtype_in, dtype_out)
+register_supported_dtypes()
@@ -0,0 +1,127 @@
+"""File copy functions."""
+
+import errno
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# ioctl request cloning a whole file (Linux, btrfs / xfs / ...), _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# copy modes, "copy" is the regular copy every other mode falls back to when it is not supported
+COPY_MODES = ("copy", "reflink", "hardlink", "copy_file_range")
+
+# errors meaning that a copy method is not supported by the platform or file systems
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EMLINK,
+}
+
+
+def reflink(path_in, path_out):
+    """Clone a file, data blocks are shared by both files until one of them is modified.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+
+    Raises:
+        OSError: Reflink is not supported.
+    """
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "Reflink is not supported on this platform.")
+
+    with open(path_in, "rb") as f_in, open(path_out, "wb") as f_out:
+        fcntl.ioctl(f_out.fileno(), FICLONE, f_in.fileno())
+
+
+def copy_range(path_in, path_out):
+    """Copy a file in kernel space without reading data in user space.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+
+    Raises:
+        OSError: Copy file range is not supported.
+    """
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "Copy file range is not supported on this platform.")
+
+    with open(path_in, "rb") as f_in, open(path_out, "wb") as f_out:
+        size = os.fstat(f_in.fileno()).st_size
+
+        while size > 0:
+            copied = os.copy_file_range(f_in.fileno(), f_out.fileno(), size)
+
+            # input file has been truncated
+            if copied == 0:
+                break
+
+            size -= copied
+
+
+def copy_file(path_in, path_out, mode="copy", data=None):
+    """Copy a file with a copy mode, falling back to a regular copy if the mode is not supported.
+    Reflink and copy file range outputs keep input file metadata like a regular copy. Hardlink
+    output shares input file metadata, and any change of its content would change input file.
+    An existing output file is replaced, whatever the copy mode.
+
+    Args:
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+        mode (str, optional): Copy mode ("copy", "reflink", "hardlink" or "copy_file_range"). Defaults to "copy".
+        data (bytes or None, optional): Input file content if input only exists in memory, it is written
+            instead of copying input file. Defaults to None.
+
+    Raises:
+        ValueError: Unknown copy mode.
+
+    Returns:
+        str: Copy mode actually used ("write" if input data was written).
+    """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Unknown copy mode. Expect one of {COPY_MODES}, but found {mode}.")
+
+    # existing output (resumed run) is replaced in every mode, a previous hardlink output is unlinked
+    # instead of being overwritten, which would overwrite its input file
+    path_out.unlink(missing_ok=True)
+
+    if data is not None:
+        path_out.write_bytes(data)
+        return "write"
+
+    try:
+        if mode == "hardlink":
+            os.link(path_in, path_out)
+            return mode
+
+        if mode == "reflink":
+            reflink(path_in, path_out)
+            shutil.copystat(path_in, path_out)
+            return mode
+
+        if mode == "copy_file_range":
+            copy_range(path_in, path_out)
+            shutil.copystat(path_in, path_out)
+            return mode
+
+    except OSError as e:
+        if e.errno not in UNSUPPORTED_ERRNOS:
+            raise
+
+        # remove partial output before falling back
+        if mode != "hardlink":
+            path_out.unlink(missing_ok=True)
+
+    shutil.copy2(path_in, path_out)
+    return "copy"
@@ -0,0 +1,415 @@
+"""SQLite job queue functions, to share a compression task between independent worker processes.
+
+Jobs are stored in summary/jobs.db, one row by input file with its queue state and its statistics columns.
+Workers claim jobs with a lease, a job whose lease expired (crashed worker) is claimed again and its
+partial outputs are removed before it is processed again. A job that crashed its workers too many times
+is failed, and its input file is copied.
+"""
+
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from mediaz.compress import check_config, compress, copy_failed_input
+from mediaz.manifest import get_config_hash, is_unchanged, read_manifest, write_manifest_entry
+from mediaz.stats import STATS_COLUMNS, StatsRecorder, init_stats, write_timings_summary
+from mediaz.utils import get_copy_path, get_files_paths, get_logger, update_stats, verify_number_of_files
+
+logger = get_logger(__name__)
+
+# queue columns, statistics columns are added after them
+QUEUE_COLUMNS = {
+    "in_path": "TEXT PRIMARY KEY",
+    "idx": "INTEGER",
+    "path_out": "TEXT",
+    "in_mtime": "INTEGER",
+    "config_hash": "TEXT",
+    "state": "TEXT",
+    "worker": "TEXT",
+    "lease_expires": "REAL",
+    "attempts": "INTEGER",
+}
+
+# final job states, a failed job crashed its workers too many times and its input file was copied
+FINAL_STATES = ("done", "failed")
+
+# statistics columns stored in jobs table, in_path is the table key
+TABLE_STATS_COLUMNS = [column for column in STATS_COLUMNS if column != "in_path"]
+
+
+def connect(path_db):
+    """Connect to the jobs database, transactions are explicit (see transaction).
+
+    Args:
+        path_db (pathlib.Path): Jobs database path.
+
+    Returns:
+        sqlite3.Connection: Database connection.
+    """
+    connection = sqlite3.connect(str(path_db), timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+@contextmanager
+def transaction(connection):
+    """Run statements in a write transaction, other workers wait until it is committed.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+
+    Yields:
+        sqlite3.Connection: Database connection.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    connection.execute("COMMIT")
+
+
+def create_table(connection):
+    """Create jobs table, statistics columns added since table creation are added to the table.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+    """
+    columns = [f"{column} {dtype}" for column, dtype in QUEUE_COLUMNS.items()] + TABLE_STATS_COLUMNS
+    connection.execute(f"CREATE TABLE IF NOT EXISTS jobs ({', '.join(columns)})")
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, idx)")
+
+    existing = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+
+    for column in TABLE_STATS_COLUMNS:
+        if column not in existing:
+            connection.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+
+
+def seed_jobs(connection, config, path_in_files, path_out_files, index, path_summary):
+    """Add new and modified input files to the jobs table as pending jobs.
+    Unchanged files already done are kept, and files already processed by a run without queue (see manifest)
+    are added as done jobs with their statistics.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+        config (dict): Config dictionary.
+        path_in_files (list): List of input files paths.
+        path_out_files (list): List of output files paths.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+        path_summary (pathlib.Path): Project summary path.
+
+    Returns:
+        int: Number of pending jobs.
+    """
+    config_hash = get_config_hash(config)
+    manifest = read_manifest(path_summary / "manifest.jsonl")
+    stats_rows = StatsRecorder(path_summary).read()
+
+    with transaction(connection):
+        jobs = {
+            row[0]: row[1:]
+            for row in connection.execute(
+                "SELECT in_path, in_size, in_mtime, config_hash, state, out_path, path_out FROM jobs"
+            )
+        }
+
+        for idx, (path_in_file, path_out_file) in enumerate(zip(path_in_files, path_out_files)):
+            in_path, in_size, in_mtime = str(path_in_file), index.get_size(path_in_file), index.get_mtime(path_in_file)
+            job = jobs.get(in_path)
+
+            # unchanged job, only its order is updated, a final job whose output was removed is processed again
+            if (
+                job is not None
+                and job[:3] == (in_size, in_mtime, config_hash)
+                and (job[3] not in FINAL_STATES or (job[4] is not None and Path(job[4]).is_file()))
+            ):
+                connection.execute(
+                    "UPDATE jobs SET idx = ?, path_out = ? WHERE in_path = ?", (idx, str(path_out_file), in_path)
+                )
+                continue
+
+            # remove output of a modified file, output path can differ from the new one
+            if job is not None and job[3] in FINAL_STATES and job[4] is not None:
+                Path(job[4]).unlink(missing_ok=True)
+
+            # job of a crashed worker is not reclaimed anymore, its partial outputs are removed now
+            elif job is not None and job[3] not in FINAL_STATES:
+                remove_partial_outputs(connection, path_in_file, Path(job[5]))
+
+            values = {column: None for column in TABLE_STATS_COLUMNS}
+            values.update({"in_size": in_size, "state": "pending", "attempts": 0})
+
+            # file processed by a run without queue
+            if (
+                job is None
+                and is_unchanged(manifest.get(in_path), in_size, in_mtime, config_hash)
+                and in_path in stats_rows
+            ):
+                values.update({column: stats_rows[in_path].get(column) for column in TABLE_STATS_COLUMNS})
+                values["state"] = "done"
+
+            values.update(
+                {
+                    "in_path": in_path,
+                    "idx": idx,
+                    "path_out": str(path_out_file),
+                    "in_mtime": in_mtime,
+                    "config_hash": config_hash,
+                    "worker": None,
+                    "lease_expires": None,
+                }
+            )
+
+            connection.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()),
+            )
+
+        return connection.execute("SELECT COUNT(*) FROM jobs WHERE state NOT IN ('done', 'failed')").fetchone()[0]
+
+
+def claim_job(connection, worker, lease):
+    """Claim the next pending job, or a running job whose lease expired.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+        worker (str): Worker identifier.
+        lease (float): Lease duration in seconds.
+
+    Returns:
+        tuple or None: Input path, output path, input size, True if the job was reclaimed and number of attempts
+            including this one, None if no job is left.
+    """
+    now = time.time()
+
+    with transaction(connection):
+        job = connection.execute(
+            "SELECT in_path, path_out, in_size, state, attempts FROM jobs "
+            "WHERE state = 'pending' OR (state = 'running' AND lease_expires < ?) ORDER BY idx LIMIT 1",
+            (now,),
+        ).fetchone()
+
+        if job is None:
+            return None
+
+        connection.execute(
+            "UPDATE jobs SET state = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+            "WHERE in_path = ?",
+            (worker, now + lease, job[0]),
+        )
+
+    return Path(job[0]), Path(job[1]), job[2], job[3] == "running", job[4] + 1
+
+
+def complete_job(connection, worker, current_stats, state="done"):
+    """Mark a claimed job as done (or failed) with its statistics.
+    Job is not updated if its lease was reclaimed by another worker in the meantime.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+        worker (str): Worker identifier.
+        current_stats (dict): Statistics dictionary of the processed file.
+        state (str, optional): Final job state ("done" or "failed"). Defaults to "done".
+
+    Returns:
+        bool: True if job was still claimed by the worker.
+    """
+    values = [current_stats[column][0] for column in TABLE_STATS_COLUMNS]
+    assignments = ", ".join(f"{column} = ?" for column in TABLE_STATS_COLUMNS)
+
+    with transaction(connection):
+        cursor = connection.execute(
+            f"UPDATE jobs SET state = ?, lease_expires = NULL, {assignments} "
+            "WHERE in_path = ? AND worker = ? AND state = 'running'",
+            [state] + values + [current_stats["in_path"][0], worker],
+        )
+
+    return cursor.rowcount == 1
+
+
+def remove_partial_outputs(connection, path_in, path_out):
+    """Remove outputs possibly half written by a crashed worker: compressed output and input file copy.
+    Outputs of other final jobs are kept.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+        path_in (pathlib.Path): Input file path.
+        path_out (pathlib.Path): Output file path.
+    """
+    path_copy = get_copy_path(path_in, path_out)
+
+    for path in (path_out, path_copy):
+        used = connection.execute(
+            "SELECT 1 FROM jobs WHERE out_path = ? AND state IN ('done', 'failed') AND in_path != ?",
+            (str(path), str(path_in)),
+        ).fetchone()
+
+        if used is None and path.is_file():
+            logger.info("Removing partial output of a crashed worker: %s", path)
+            path.unlink()
+
+
+class LeaseKeeper(threading.Thread):
+    """Thread renewing the lease of the job claimed by a worker, so that long jobs are not reclaimed."""
+
+    def __init__(self, path_db, worker, lease):
+        """Initialize object.
+
+        Args:
+            path_db (pathlib.Path): Jobs database path.
+            worker (str): Worker identifier.
+            lease (float): Lease duration in seconds.
+        """
+        super().__init__(daemon=True)
+        self.path_db = path_db
+        self.worker = worker
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        """Renew leases of running jobs of the worker, three times by lease duration."""
+        connection = connect(self.path_db)
+
+        while not self.stopped.wait(self.lease / 3):
+            with transaction(connection):
+                connection.execute(
+                    "UPDATE jobs SET lease_expires = ? WHERE worker = ? AND state = 'running'",
+                    (time.time() + self.lease, self.worker),
+                )
+
+        connection.close()
+
+    def stop(self):
+        """Stop renewing leases."""
+        self.stopped.set()
+        self.join()
+
+
+def finalize_queue(connection, path_in, path_data, path_summary, index):
+    """Write statistics file from the jobs table and verify the project, once all jobs are done.
+
+    Args:
+        connection (sqlite3.Connection): Database connection.
+        path_in (pathlib.Path): Input directory path.
+        path_data (pathlib.Path): Project data path.
+        path_summary (pathlib.Path): Project summary path.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+
+    Returns:
+        bool: True if all jobs were done and project was finalized.
+    """
+    with transaction(connection):
+        remaining = connection.execute("SELECT COUNT(*) FROM jobs WHERE state NOT IN ('done', 'failed')").fetchone()[0]
+        rows = connection.execute(f"SELECT in_path, {', '.join(TABLE_STATS_COLUMNS)} FROM jobs ORDER BY idx").fetchall()
+
+    if remaining > 0:
+        logger.info("%s jobs are still processed by other workers.", remaining)
+        return False
+
+    rows = [dict(zip(["in_path"] + TABLE_STATS_COLUMNS, row)) for row in rows]
+
+    # temporary outputs of crashed workers, spilled outputs (files) and video segments (directories)
+    for path in list(path_data.rglob(".mediaz_*")):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    # written then renamed, concurrent workers finishing together never leave a partial file
+    path_tmp = path_summary / f".stats_{uuid.uuid4().hex}.json"
+
+    import pandas as pd
+
+    pd.DataFrame.from_records(rows, columns=STATS_COLUMNS).to_json(str(path_tmp))
+    os.replace(path_tmp, path_summary / "stats.json")
+    write_timings_summary(rows, path_summary, logger)
+
+    verify_number_of_files(path_in, path_data, index)
+    return True
+
+
+def run_queue(config, path_in, path_data, path_summary, index):
+    """Run a queue worker, processing jobs one by one until no job is left.
+    Several workers can run concurrently on the same project, the last one writes the statistics file.
+
+    Raises:
+        KeyError: Invalid out dtype keys.
+        TypeError: Invalid output format.
+        ValueError: Invalid copy mode.
+
+    Args:
+        config (dict): Config dictionary.
+        path_in (pathlib.Path): Input directory path.
+        path_data (pathlib.Path): Project data path.
+        path_summary (pathlib.Path): Project summary path.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+    """
+    check_config(config)
+
+    path_db = path_summary / "jobs.db"
+    lease = config.get("queue_lease", 300)
+    max_attempts = config.get("queue_max_attempts", 3)
+    worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    config_hash = get_config_hash(config)
+
+    connection = connect(path_db)
+    create_table(connection)
+
+    path_in_files, path_out_files = get_files_paths(
+        path_in, path_data, config["out_dtype"], config["apply_snake_case"], index
+    )
+
+    pending = seed_jobs(connection, config, path_in_files, path_out_files, index, path_summary)
+    logger.info("Starting queue worker %s, %s jobs are pending.", worker, pending)
+
+    lease_keeper = LeaseKeeper(path_db, worker, lease)
+    lease_keeper.start()
+
+    try:
+        with (
+            StatsRecorder(path_summary) as stats_recorder,
+            open(path_summary / "manifest.jsonl", "a", encoding="utf-8") as f,
+        ):
+            while (job := claim_job(connection, worker, lease)) is not None:
+                path_in_file, path_out_file, in_size, reclaimed, attempts = job
+
+                if reclaimed:
+                    remove_partial_outputs(connection, path_in_file, path_out_file)
+
+                # file crashed every worker that processed it (segfault, killed for memory), it is copied as a failure
+                if attempts > max_attempts:
+                    logger.error("Job crashed its workers %s times: %s", attempts - 1, path_in_file)
+                    current_stats = update_stats(init_stats(), {"in_path": str(path_in_file), "in_size": in_size})
+                    current_stats = copy_failed_input(path_in_file, path_out_file, config, current_stats)
+                    state = "failed"
+
+                else:
+                    current_stats = compress(path_in_file, path_out_file, config, in_size)
+                    state = "done"
+
+                if not complete_job(connection, worker, current_stats, state):
+                    logger.warning("Job lease was lost, job is processed by another worker: %s", path_in_file)
+                    continue
+
+                # statistics log and manifest are kept up to date for runs without queue
+                stats_recorder.record(current_stats)
+                write_manifest_entry(
+                    f, path_in_file, in_size, index.get_mtime(path_in_file), config_hash, current_stats
+                )
+
+    finally:
+        lease_keeper.stop()
+
+    finalize_queue(connection, path_in, path_data, path_summary, index)
+    connection.close()
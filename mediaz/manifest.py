@@ -0,0 +1,94 @@
+"""Project manifest functions."""
+
+import hashlib
+import json
+from pathlib import Path
+
+
+def get_config_hash(config):
+    """Get hash of config values that have an impact on output files.
+
+    Args:
+        config (dict): Config dictionary.
+
+    Returns:
+        str: Config hash.
+    """
+    keys = ["copy_if_larger", "apply_snake_case", "out_dtype", "compress_params", "skip_prediction"]
+    data = {key: config.get(key) for key in keys}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_manifest(path):
+    """Read manifest file of a project.
+    Manifest is a JSON lines file, where each line maps an input file to its output file.
+    If an input file has several entries, the last one is kept.
+
+    Args:
+        path (pathlib.Path): Manifest file path.
+
+    Returns:
+        dict: Manifest entries by input file path.
+    """
+    manifest = {}
+
+    if not path.is_file():
+        return manifest
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            # skip truncated line of an interrupted run
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            manifest[entry["in_path"]] = entry
+
+    return manifest
+
+
+def is_unchanged(entry, in_size, in_mtime, config_hash):
+    """Check if an input file has already been processed with same content and config.
+
+    Args:
+        entry (dict or None): Manifest entry of the input file.
+        in_size (int): Input file size.
+        in_mtime (int): Input file modification time in nanoseconds.
+        config_hash (str): Current config hash.
+
+    Returns:
+        bool: True if input file can be skipped.
+    """
+    if entry is None:
+        return False
+
+    return (
+        entry["in_size"] == in_size
+        and entry["in_mtime"] == in_mtime
+        and entry["config_hash"] == config_hash
+        and Path(entry["out_path"]).is_file()
+    )
+
+
+def write_manifest_entry(f, path_in_file, in_size, in_mtime, config_hash, current_stats):
+    """Append a processed file entry to the manifest, flushed to resume an interrupted run.
+
+    Args:
+        f (io.TextIOWrapper): Manifest file opened in append mode.
+        path_in_file (pathlib.Path): Input file path.
+        in_size (int): Input file size.
+        in_mtime (int): Input file modification time in nanoseconds.
+        config_hash (str): Config hash.
+        current_stats (dict): Statistics dictionary of the processed file.
+    """
+    entry = {
+        "in_path": str(path_in_file),
+        "in_size": in_size,
+        "in_mtime": in_mtime,
+        "config_hash": config_hash,
+        "out_path": current_stats["out_path"][0],
+        "status": current_stats["status"][0],
+    }
+    f.write(json.dumps(entry) + "\n")
+    f.flush()
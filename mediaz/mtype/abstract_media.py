@@ -4,7 +4,24 @@ from abc import ABC, abstractmethod
 
 
 class AbstractMedia(ABC):
-    """Abstract media class for specific medias classes."""
+    """Abstract media class for specific medias classes.
+
+    Subclasses define:
+    - kind: key of the output data type in config out_dtype ("image" or "video").
+    - buffered: if true, read accepts input file data (io.BytesIO) and write accepts a binary file object,
+      so that the media is decoded and encoded in memory, else only file paths are accepted.
+    - readers: read functions by input data type category, called as reader(media, path, compress_params).
+    - writers: write functions by output format, called as writer(media, path, compress_params).
+    """
+
+    kind = None
+    buffered = False
+    readers = {}
+    writers = {}
+
+    # functions registered after class definition (register_reader, register_writer), as (kind, key, function),
+    # given to process pool workers that only import modules (see mediaz.dtype.dtype.get_registrations)
+    registered = ()
 
     def __init__(self, dtype_in, dtype_out):
         """Initialize object.
@@ -17,12 +34,69 @@ class AbstractMedia(ABC):
         self.dtype_in = dtype_in
         self.dtype_out = dtype_out
 
+        # extra statistics columns values filled while reading or writing the media
+        self.stats = {}
+
+    @classmethod
+    def register_reader(cls, category, reader):
+        """Register a read function for an input data type category.
+
+        Args:
+            category (str): Input data type category name.
+            reader (callable): Read function, called as reader(media, path, compress_params).
+        """
+        cls.readers = {**cls.readers, category: reader}
+        cls.registered = (*cls.registered, ("reader", category, reader))
+
+    @classmethod
+    def register_writer(cls, fmt, writer):
+        """Register a write function for an output format.
+
+        Args:
+            fmt (str): Output format string.
+            writer (callable): Write function, called as writer(media, path, compress_params).
+        """
+        cls.writers = {**cls.writers, fmt: writer}
+        cls.registered = (*cls.registered, ("writer", fmt, writer))
+
+    def predict_compressible(self, path, in_size, compress_params, skip_params):
+        """Predict if compression can reduce the input file size, without decoding the input file.
+
+        Args:
+            path (str or io.BytesIO): Input file path, or input file data if media is buffered.
+            in_size (int): Input file size.
+            compress_params (dict): Compression parameters.
+            skip_params (dict): Skip prediction parameters.
+
+        Returns:
+            bool: True if compression is expected to reduce the file size.
+        """
+        return True
+
+    def estimate_memory(self, path, in_size, compress_params):
+        """Estimate peak memory used to read and write the media, without decoding the input file.
+
+        Args:
+            path (str or io.BytesIO): Input file path, or input file data if media is buffered.
+            in_size (int): Input file size.
+            compress_params (dict): Compression parameters.
+
+        Returns:
+            int: Estimated peak memory in bytes, 0 if it is not estimated.
+        """
+        return 0
+
+    def close(self):
+        """Release media buffers."""
+        self.media = None
+
     @abstractmethod
-    def read(self, path):
+    def read(self, path, compress_params):
         """Read a media file.
 
         Args:
-            path (str): Input file path.
+            path (str or io.BytesIO): Input file path, or input file data if media is buffered.
+            compress_params (dict): Compression parameters.
 
         Raises:
             NotImplementedError: Method is not implemented is abstract class.
@@ -34,7 +108,7 @@ class AbstractMedia(ABC):
         """Write and compress a media file.
 
         Args:
-            path (str): Output file path.
+            path (str or io.BufferedIOBase): Output file path, or binary file object if media is buffered.
             compress_params (dict): Compression parameters.
 
         Raises:
@@ -1,85 +1,512 @@
 """Image media class."""
 
-import rawpy
-from PIL import Image, ImageFile
-from pillow_heif import register_heif_opener
+import io
+import time
+
+import numpy as np
+from PIL import Image, ImageFile, ImageMode
 
 from mediaz.dtype.dtype_support import DataTypesIn
 from mediaz.mtype.abstract_media import AbstractMedia
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+# LibRaw image flip values to PIL transpositions
+RAW_FLIP_TRANSPOSE = {
+    3: Image.Transpose.ROTATE_180,
+    5: Image.Transpose.ROTATE_90,
+    6: Image.Transpose.ROTATE_270,
+}
+
+# JPEG standard luminance quantization table (natural order) used by libjpeg quality scaling
+STANDARD_LUMINANCE_TABLE = [
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+]  # fmt: skip
+
+# JPEG quality search targets, quality is searched if any of them is set
+JPEG_TARGETS = ["target_bytes_per_megapixel", "target_max_size", "target_min_ssim"]
+
+
+# HEIF opener registration state, registered once by process
+__heif_registered = False
+
+
+def register_heif():
+    """Register HEIF opener in PIL, once by process, pillow_heif is only imported when an image is read."""
+    global __heif_registered
+
+    if not __heif_registered:
+        from pillow_heif import register_heif_opener
+
+        register_heif_opener()
+        __heif_registered = True
+
+
+def estimate_jpeg_quality(quantization):
+    """Estimate JPEG quality from its quantization tables.
+    Inverse of libjpeg quality scaling, applied to the luminance table:
+    scale = 5000 / quality if quality < 50 else 200 - 2 * quality
+
+    Args:
+        quantization (dict): Quantization tables by table index, as read by PIL.
+
+    Returns:
+        float: Estimated quality in [1, 100].
+    """
+    scale = 100 * sum(quantization[0]) / sum(STANDARD_LUMINANCE_TABLE)
+
+    if scale <= 100:
+        quality = (200 - scale) / 2
+    else:
+        quality = 5000 / scale
+
+    return max(1, min(100, quality))
+
+
+def box_filter(array, window):
+    """Mean of each window x window block of an array, computed from its integral image.
+
+    Args:
+        array (numpy.ndarray): 2D array.
+        window (int): Window size.
+
+    Returns:
+        numpy.ndarray: 2D array of windows means, shape is reduced by window - 1.
+    """
+    integral = np.pad(array, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+
+    return (
+        integral[window:, window:]
+        - integral[:-window, window:]
+        - integral[window:, :-window]
+        + integral[:-window, :-window]
+    ) / (window * window)
+
+
+def compute_ssim(luma_x, luma_y, window=7):
+    """Compute mean structural similarity (SSIM) between two luma planes, with a uniform window.
+
+    Args:
+        luma_x (numpy.ndarray): 2D luma array.
+        luma_y (numpy.ndarray): 2D luma array with the same shape.
+        window (int, optional): Window size. Defaults to 7.
+
+    Returns:
+        float: Mean SSIM in [-1, 1], 1 for identical planes.
+    """
+    x, y = luma_x.astype(np.float64), luma_y.astype(np.float64)
+    window = max(1, min(window, *x.shape))
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    mu_x, mu_y = box_filter(x, window), box_filter(y, window)
+    sigma_x = box_filter(x * x, window) - mu_x**2
+    sigma_y = box_filter(y * y, window) - mu_y**2
+    sigma_xy = box_filter(x * y, window) - mu_x * mu_y
+
+    ssim = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / ((mu_x**2 + mu_y**2 + c1) * (sigma_x + sigma_y + c2))
+    return float(ssim.mean())
+
+
+def get_max_dimension_size(size, max_dimension):
+    """Get image size with its long edge limited to a maximum dimension, keeping aspect ratio.
+
+    Args:
+        size (tuple): Image size (width, height).
+        max_dimension (int): Maximum long edge size, 0 disables the limit.
+
+    Returns:
+        tuple: Image size (width, height).
+    """
+    if max_dimension <= 0 or max(size) <= max_dimension:
+        return size
+
+    scale = max_dimension / max(size)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def get_draft_size(size, requested_size):
+    """Get the size of a JPEG image decoded in draft mode, scaled down by a power of two up to 8.
+
+    Args:
+        size (tuple): Image size (width, height).
+        requested_size (tuple): Requested size (width, height), decoded size is never smaller.
+
+    Returns:
+        tuple: Decoded image size (width, height).
+    """
+    scale = 1
+
+    while scale < 8 and size[0] // (scale * 2) >= requested_size[0] and size[1] // (scale * 2) >= requested_size[1]:
+        scale *= 2
+
+    return -(-size[0] // scale), -(-size[1] // scale)
+
+
+def get_bytes_per_pixel(mode):
+    """Get bytes per pixel of a PIL image mode in PIL storage.
+    Multiband images are stored with 32 bits per pixel (RGB is stored as RGBX).
+
+    Args:
+        mode (str): PIL image mode.
+
+    Returns:
+        int: Bytes per pixel.
+    """
+    mode = ImageMode.getmode(mode)
+
+    if len(mode.bands) > 1:
+        return max(4, len(mode.bands) * np.dtype(mode.typestr).itemsize)
+    return np.dtype(mode.typestr).itemsize
+
 
 class ImageMedia(AbstractMedia):
     """Image media class to handle image I/O and compression."""
 
-    def __read_pil(self, path):
+    def __read_pil(self, path, compress_params):
         """Read an image supported by PIL.
+        Oversized JPEG images are decoded at reduced scale with DCT scaling (draft mode),
+        the decoded image is never smaller than the size requested by max_dimension.
 
         Args:
-            path (str): Input path.
+            path (str or io.BytesIO): Input path or input file data.
+            compress_params (dict): Compression parameters.
         """
-        register_heif_opener()
+        register_heif()
         self.media = Image.open(path)
 
-    def __read_raw(self, path):
+        size = get_max_dimension_size(self.media.size, compress_params[self.dtype_out["fmt"]].get("max_dimension", 0))
+
+        if self.media.format == "JPEG" and size != self.media.size:
+            self.media.draft(None, size)
+
+        # image is opened lazily, decode it now so that reading covers decoding
+        self.media.load()
+
+    def __read_raw_preview(self, raw, raw_params):
+        """Read the camera embedded preview of a RAW image.
+
+        Args:
+            raw (rawpy.RawPy): RAW image.
+            raw_params (dict): RAW decoding parameters.
+
+        Returns:
+            PIL.Image.Image or None: Preview image, or None if there is no preview large enough.
+        """
+        import rawpy
+
+        try:
+            thumb = raw.extract_thumb()
+        except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+            return None
+
+        if thumb.format == rawpy.ThumbFormat.JPEG:
+            preview = Image.open(io.BytesIO(thumb.data))
+        else:
+            preview = Image.fromarray(thumb.data)
+
+        if max(preview.size) < raw_params.get("min_preview_dimension", 0):
+            return None
+
+        # preview is stored in sensor orientation
+        if raw.sizes.flip in RAW_FLIP_TRANSPOSE:
+            preview = preview.transpose(RAW_FLIP_TRANSPOSE[raw.sizes.flip])
+
+        return preview
+
+    def __read_raw(self, path, compress_params):
         """Read a RAW image.
+        Embedded preview is used if enabled and large enough, else the RAW image is demosaiced.
 
         Args:
-            path (str): Input path.
+            path (str or io.BytesIO): Input path or input file data.
+            compress_params (dict): Compression parameters.
         """
+        # imported on first RAW image, most runs have none
+        import rawpy
+
+        raw_params = compress_params.get("RAW", {})
+
         with rawpy.imread(path) as raw:
-            rgb = raw.postprocess()
+            if raw_params.get("use_embedded_preview", False):
+                self.media = self.__read_raw_preview(raw, raw_params)
+
+                if self.media is not None:
+                    return
+
+            rgb = raw.postprocess(
+                half_size=raw_params.get("half_size", False),
+                demosaic_algorithm=rawpy.DemosaicAlgorithm[raw_params.get("demosaic_algorithm", "AHD")],
+            )
 
+        # PIL stores RGB pixels padded to 4 bytes, unpacking the array into PIL storage can't be avoided,
+        # array is released right after so that both buffers do not outlive the conversion
         self.media = Image.fromarray(rgb)
+        del rgb
 
-    def __write_jpg(self, path, compress_params):
-        """Compress and write a JPEG image with PIL.
+    def __encode_jpg(self, quality, compress_params):
+        """Compress a JPEG image in memory.
 
         Args:
-            path (str): Input path.
+            quality (int): JPEG quality.
             compress_params (dict): Compression parameters.
+
+        Returns:
+            bytes: JPEG data.
         """
+        buffer = io.BytesIO()
+
         self.media.save(
-            path,
-            quality=compress_params["quality"],
+            buffer,
+            format="JPEG",
+            quality=quality,
             optimize=compress_params["optimize"],
             subsampling=compress_params["subsampling"],
         )
+        return buffer.getvalue()
 
-    def read(self, path):
-        """Read an image file.
+    def __get_luma(self, image, size):
+        """Get downsampled luma plane of an image.
 
         Args:
-            path (str): Input path.
+            image (PIL.Image.Image): Image.
+            size (tuple): Downsampled size.
 
-        Raises:
-            TypeError: Unknown input format.
+        Returns:
+            numpy.ndarray: 2D luma array.
+        """
+        return np.asarray(image.convert("L").resize(size, Image.Resampling.BOX))
+
+    def __search_jpg_quality(self, compress_params):
+        """Search the JPEG quality meeting targets by bisection, with encodes done in memory.
+        Size targets give the highest quality with a small enough file, then SSIM target
+        gives the lowest quality (smallest file) below it with a high enough SSIM.
+
+        Args:
+            compress_params (dict): Compression parameters.
+
+        Returns:
+            int: JPEG quality.
+            bytes: JPEG data.
         """
-        if self.dtype_in["category"] == DataTypesIn.IMAGE_PIL.name:
-            self.__read_pil(path)
+        encodes = {}
 
-        elif self.dtype_in["category"] == DataTypesIn.IMAGE_RAW.name:
-            self.__read_raw(path)
+        def encode(quality):
+            if quality not in encodes:
+                encodes[quality] = self.__encode_jpg(quality, compress_params)
+            return encodes[quality]
 
+        def bisect(low, high, is_valid, highest):
+            # highest (or lowest) quality in [low, high] that is valid, None if there is none
+            found = None
+            while low <= high:
+                middle = (low + high) // 2
+                if is_valid(middle):
+                    found = middle
+                    low, high = (middle + 1, high) if highest else (low, middle - 1)
+                else:
+                    low, high = (low, middle - 1) if highest else (middle + 1, high)
+            return found
+
+        min_quality, quality = compress_params["target_min_quality"], compress_params["quality"]
+
+        # size targets
+        max_sizes = []
+        if compress_params.get("target_bytes_per_megapixel", 0) > 0:
+            megapixels = self.media.width * self.media.height / 1e6
+            max_sizes.append(compress_params["target_bytes_per_megapixel"] * megapixels)
+        if compress_params.get("target_max_size", 0) > 0:
+            max_sizes.append(compress_params["target_max_size"])
+
+        if len(max_sizes) > 0:
+            quality = bisect(min_quality, quality, lambda q: len(encode(q)) <= min(max_sizes), True) or min_quality
+
+        # SSIM target, on a downsampled luma plane
+        if compress_params.get("target_min_ssim", 0) > 0:
+            size = get_max_dimension_size(self.media.size, 512)
+            luma = self.__get_luma(self.media, size)
+
+            def is_similar(q):
+                with Image.open(io.BytesIO(encode(q))) as image:
+                    return compute_ssim(luma, self.__get_luma(image, size)) >= compress_params["target_min_ssim"]
+
+            quality = bisect(min_quality, quality, is_similar, False) or quality
+
+        return quality, encode(quality)
+
+    def __write_jpg(self, path, compress_params):
+        """Compress and write a JPEG image with PIL.
+        If a target is set, quality is searched in memory and only the selected encode is written.
+
+        Args:
+            path (str or io.BufferedIOBase): Output path or binary file object.
+            compress_params (dict): Compression parameters.
+        """
+        if not any(compress_params.get(target, 0) > 0 for target in JPEG_TARGETS):
+            self.media.save(
+                path,
+                format="JPEG",
+                quality=compress_params["quality"],
+                optimize=compress_params["optimize"],
+                subsampling=compress_params["subsampling"],
+            )
+            return
+
+        quality, data = self.__search_jpg_quality(compress_params)
+        self.stats["jpeg_quality"] = quality
+
+        if isinstance(path, str):
+            with open(path, "wb") as f:
+                f.write(data)
         else:
+            path.write(data)
+
+    def predict_compressible(self, path, in_size, compress_params, skip_params):
+        """Predict from image header if JPEG compression can reduce the file size.
+        JPEG inputs are compared with their estimated quality, other inputs with their bits per pixel.
+        Images are always compressed when a quality search target is set, or when they exceed max_dimension.
+
+        Args:
+            path (str or io.BytesIO): Input file path or input file data.
+            in_size (int): Input file size.
+            compress_params (dict): Compression parameters.
+            skip_params (dict): Skip prediction parameters.
+
+        Returns:
+            bool: True if compression is expected to reduce the file size.
+        """
+        if self.dtype_in["category"] != DataTypesIn.IMAGE_PIL.name or self.dtype_out["fmt"] != "JPEG":
+            return True
+
+        # quality is searched to reach a target, compression can reduce the size whatever the input quality
+        if any(compress_params["JPEG"].get(target, 0) > 0 for target in JPEG_TARGETS):
+            return True
+
+        register_heif()
+
+        # only image header is read, pixels are not decoded
+        with Image.open(path) as image:
+            # oversized image is downscaled, compression reduces its size
+            if get_max_dimension_size(image.size, compress_params["JPEG"].get("max_dimension", 0)) != image.size:
+                return True
+
+            if image.format == "JPEG" and getattr(image, "quantization", None):
+                quality = estimate_jpeg_quality(image.quantization)
+                return quality > compress_params["JPEG"]["quality"] + skip_params["jpeg_quality_margin"]
+
+            bits_per_pixel = 8 * in_size / (image.width * image.height)
+
+        return bits_per_pixel >= skip_params["min_bits_per_pixel"]
+
+    def estimate_memory(self, path, in_size, compress_params):
+        """Estimate peak memory used to decode, convert, downscale and encode an image.
+        PIL images size is read from the header, RAW images size is estimated from the file size.
+
+        Args:
+            path (str or io.BytesIO): Input file path or input file data.
+            in_size (int): Input file size.
+            compress_params (dict): Compression parameters.
+
+        Returns:
+            int: Estimated peak memory in bytes.
+        """
+        max_dimension = compress_params[self.dtype_out["fmt"]].get("max_dimension", 0)
+
+        if self.dtype_in["category"] == DataTypesIn.IMAGE_RAW.name:
+            # about one pixel per byte of a RAW file (12 or 14 bits per pixel, often losslessly compressed)
+            pixels = in_size
+            rgb_pixels = pixels // 4 if compress_params.get("RAW", {}).get("half_size", False) else pixels
+
+            # 16 bits sensor data and demosaiced RGB array coexist, then RGB array and its PIL copy
+            return max(2 * pixels + 3 * rgb_pixels, 3 * rgb_pixels + 4 * rgb_pixels)
+
+        register_heif()
+
+        # only image header is read, pixels are not decoded
+        with Image.open(path) as image:
+            size, mode, fmt = image.size, image.mode, image.format
+
+        size_out = get_max_dimension_size(size, max_dimension)
+
+        if fmt == "JPEG" and size_out != size:
+            size = get_draft_size(size, size_out)
+
+        # decoded image and its RGB copy coexist during conversion, then RGB image and its downscaled copy
+        decoded = size[0] * size[1] * get_bytes_per_pixel(mode)
+        rgb = size[0] * size[1] * get_bytes_per_pixel("RGB") if mode != "RGB" else 0
+        downscaled = size_out[0] * size_out[1] * get_bytes_per_pixel("RGB") if size_out != size else 0
+
+        return max(decoded + rgb, max(decoded, rgb) + downscaled)
+
+    def close(self):
+        """Close image and release its buffers."""
+        if self.media is not None:
+            self.media.close()
+            self.media = None
+
+    kind = "image"
+    buffered = True
+
+    readers = {
+        DataTypesIn.IMAGE_PIL.name: __read_pil,
+        DataTypesIn.IMAGE_RAW.name: __read_raw,
+    }
+
+    writers = {
+        "JPEG": __write_jpg,
+    }
+
+    def read(self, path, compress_params):
+        """Read an image file.
+
+        Args:
+            path (str or io.BytesIO): Input path or input file data.
+            compress_params (dict): Compression parameters.
+
+        Raises:
+            TypeError: Unknown input format.
+        """
+        if self.dtype_in["category"] not in self.readers:
             raise TypeError(f"Unknown input format. Found {self.dtype_in}.")
 
+        self.readers[self.dtype_in["category"]](self, path, compress_params)
+
     def write(self, path, compress_params):
         """Compress an image and write.
+        Image is downscaled with a high quality resampling if it exceeds max_dimension.
 
         Args:
-            path (str): Input path.
+            path (str or io.BufferedIOBase): Output path or binary file object.
             compress_params (dict): Compression parameters.
 
         Raises:
             TypeError: Unknown output format.
         """
+        start = time.perf_counter()
+
+        # previous image buffers are released as soon as each copy is made
         if self.media.mode != "RGB":
-            self.media = self.media.convert("RGB")
+            image = self.media.convert("RGB")
+            self.media.close()
+            self.media = image
 
-        if self.dtype_out["fmt"] == "JPEG":
-            self.__write_jpg(path, compress_params["JPEG"])
+        size = get_max_dimension_size(self.media.size, compress_params[self.dtype_out["fmt"]].get("max_dimension", 0))
 
-        else:
+        if size != self.media.size:
+            image = self.media.resize(size, Image.Resampling.LANCZOS)
+            self.media.close()
+            self.media = image
+
+        self.stats["time_convert"] = time.perf_counter() - start
+
+        if self.dtype_out["fmt"] not in self.writers:
             raise TypeError(f"Unknown output format. Found {self.dtype_out}.")
+
+        self.writers[self.dtype_out["fmt"]](self, path, compress_params[self.dtype_out["fmt"]])
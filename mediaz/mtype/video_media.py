@@ -1,21 +1,277 @@
 """Video media class."""
 
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import ffmpeg
 
 from mediaz.dtype.dtype_support import DataTypesIn
 from mediaz.mtype.abstract_media import AbstractMedia
 
 
+def get_streams(probe):
+    """Get first video stream and first audio stream of a probed file.
+
+    Args:
+        probe (dict): ffprobe dictionary.
+
+    Returns:
+        dict or None: ffprobe video stream dictionary.
+        dict or None: ffprobe audio stream dictionary.
+    """
+    streams = probe.get("streams", [])
+    video_stream = next((stream for stream in streams if stream["codec_type"] == "video"), None)
+    audio_stream = next((stream for stream in streams if stream["codec_type"] == "audio"), None)
+    return video_stream, audio_stream
+
+
+def get_frame_rate(stream):
+    """Get frame rate of a probed video stream.
+
+    Args:
+        stream (dict): ffprobe stream dictionary.
+
+    Returns:
+        float: Frame rate, 0 if unknown.
+    """
+    for key in ["avg_frame_rate", "r_frame_rate"]:
+        numerator, _, denominator = stream.get(key, "0/0").partition("/")
+
+        if float(numerator or 0) > 0 and float(denominator or 0) > 0:
+            return float(numerator) / float(denominator)
+
+    return 0.0
+
+
+def get_video_bitrate(probe, video_stream, audio_stream):
+    """Get bitrate of a probed video stream.
+    Some containers (mkv, webm, ...) do not store streams bitrates, container bitrate is then used.
+
+    Args:
+        probe (dict): ffprobe dictionary.
+        video_stream (dict): ffprobe video stream dictionary.
+        audio_stream (dict or None): ffprobe audio stream dictionary.
+
+    Returns:
+        float: Video bitrate in bits/s.
+    """
+    if "bit_rate" in video_stream:
+        return float(video_stream["bit_rate"])
+
+    bitrate = float(probe["format"].get("bit_rate", 0))
+
+    if audio_stream is not None:
+        bitrate -= float(audio_stream.get("bit_rate", 0))
+
+    return max(0.0, bitrate)
+
+
+def get_video_action(probe, compress_params):
+    """From ffprobe metadata, choose how a video is written:
+    - remux: video and audio streams are copied, video already meets the target codec and bits per pixel.
+    - copy_audio: video is encoded, audio stream is copied.
+    - transcode: video and audio streams are encoded.
+
+    Args:
+        probe (dict): ffprobe dictionary.
+        compress_params (dict): Compression parameters.
+
+    Returns:
+        str: Video action.
+    """
+    video_stream, audio_stream = get_streams(probe)
+
+    if video_stream is None:
+        return "transcode"
+
+    copy_audio = audio_stream is None or audio_stream["codec_name"] in compress_params["copy_acodecs"]
+
+    # bits per pixel normalizes bitrate by resolution and frame rate
+    pixels_per_second = video_stream.get("width", 0) * video_stream.get("height", 0) * get_frame_rate(video_stream)
+    bitrate = get_video_bitrate(probe, video_stream, audio_stream)
+
+    copy_video = (
+        video_stream["codec_name"] in compress_params["copy_vcodecs"]
+        and pixels_per_second > 0
+        and 0 < bitrate / pixels_per_second <= compress_params["copy_max_bits_per_pixel"]
+    )
+
+    if copy_video and copy_audio:
+        return "remux"
+
+    if copy_audio:
+        return "copy_audio"
+
+    return "transcode"
+
+
 class VideoMedia(AbstractMedia):
     """Video media class to handle image I/O and compression."""
 
-    def __read_ffmpeg(self, path):
+    def __read_ffmpeg(self, path, compress_params):
         """Read a video supported by ffmpeg.
+        If probe is enabled, ffprobe metadata are used to choose if streams are copied or encoded.
 
         Args:
             path (str): Input path.
+            compress_params (dict): Compression parameters.
         """
+        self.path = path
         self.media = ffmpeg.input(path)
+        self.action = "transcode"
+        self.vcodec_in = None
+        self.has_audio = True
+        self.duration = 0.0
+
+        params = compress_params[self.dtype_out["fmt"]]
+
+        if params.get("probe", False) or params.get("segment", False):
+            probe = ffmpeg.probe(path)
+            video_stream, audio_stream = get_streams(probe)
+
+            self.vcodec_in = None if video_stream is None else video_stream["codec_name"]
+            self.has_audio = audio_stream is not None
+            self.duration = float(probe["format"].get("duration", 0))
+            self.stats = {"in_duration": self.duration}
+
+            if params.get("probe", False):
+                self.action = get_video_action(probe, params)
+                self.stats["video_action"] = self.action
+
+    def __get_mp4_params(self, compress_params, threads):
+        """Get ffmpeg video and audio output parameters of MP4 compression.
+
+        Args:
+            compress_params (dict): Compression parameters.
+            threads (int): Number of encoding threads (x265 thread pool), 0 lets ffmpeg use all cores.
+
+        Returns:
+            dict: Video output parameters.
+            dict: Audio output parameters.
+        """
+        # encoder decisions do not depend on the threads budget, so that outputs are identical for any number of
+        # workers: x265 frame threads and lookahead threads are pinned, and encoder settings (pools) are not written
+        x265_params = f"{compress_params['libx265_loglevel']}:frame-threads=1:lookahead-threads=1:info=0"
+
+        video_params = {
+            "vcodec": compress_params["vcodec"],
+            "crf": compress_params["crf"],
+            "pix_fmt": compress_params["pix_fmt"],
+            "preset": compress_params["preset"],
+        }
+
+        audio_params = {
+            "acodec": compress_params["acodec"],
+            "audio_bitrate": compress_params["audio_bitrate"],
+        }
+
+        if threads > 0:
+            video_params["threads"] = threads
+            x265_params = f"{x265_params}:pools={threads}"
+
+        video_params["x265-params"] = x265_params
+
+        # stream copy, hvc1 tag makes HEVC streams playable by most MP4 players
+        if self.action == "remux":
+            video_params = {"vcodec": "copy"}
+
+            if self.vcodec_in == "hevc":
+                video_params["vtag"] = "hvc1"
+
+        if self.action in ["remux", "copy_audio"]:
+            audio_params = {"acodec": "copy"}
+
+        return video_params, audio_params
+
+    def __is_segmented(self, compress_params):
+        """Check if video is long enough to be encoded in segments, its duration must be known.
+
+        Args:
+            compress_params (dict): Compression parameters.
+
+        Returns:
+            bool: True if video is encoded in segments.
+        """
+        if not compress_params.get("segment", False) or self.action == "remux":
+            return False
+
+        # unknown container duration, segment time would be 0 and split video at every keyframe
+        if self.duration <= 0:
+            return False
+
+        min_size = compress_params.get("segment_min_size", 0)
+
+        return (
+            self.duration >= compress_params["segment_min_duration"]
+            or min_size > 0
+            and Path(self.path).stat().st_size >= min_size
+        )
+
+    def __write_mp4_segments(self, path, compress_params, threads):
+        """Compress a long video in segments encoded concurrently, and write a MP4 video.
+        Video stream is split at keyframes without encoding, each segment is encoded by its own ffmpeg process,
+        then encoded segments are concatenated without encoding and muxed with the input audio stream.
+        Existing files are overwritten, like the partial output of an interrupted run.
+
+        Args:
+            path (str): Output path.
+            compress_params (dict): Compression parameters.
+            threads (int): Threads budget shared by segments, 0 uses all CPU cores.
+        """
+        n_segments = max(1, compress_params["segments"])
+
+        # share the threads budget between segments
+        threads = threads if threads > 0 else os.cpu_count() or 1
+        video_params, audio_params = self.__get_mp4_params(compress_params, max(1, threads // n_segments))
+        loglevel = compress_params["loglevel"]
+
+        with tempfile.TemporaryDirectory(prefix=".mediaz_", dir=Path(path).parent) as path_tmp:
+            path_tmp = Path(path_tmp)
+
+            # split video stream at keyframes, segments are at least duration / n_segments long
+            ffmpeg.input(self.path).output(
+                str(path_tmp / "segment_%04d.mkv"),
+                map="0:v:0",
+                vcodec="copy",
+                f="segment",
+                segment_time=self.duration / n_segments,
+                reset_timestamps=1,
+                loglevel=loglevel,
+            ).run(overwrite_output=True)
+
+            path_segments = sorted(path_tmp.glob("segment_*.mkv"))
+            path_encoded_segments = [path_tmp / f"encoded_{path_segment.name}" for path_segment in path_segments]
+
+            def encode_segment(idx):
+                ffmpeg.input(str(path_segments[idx])).output(
+                    str(path_encoded_segments[idx]), an=None, loglevel=loglevel, **video_params
+                ).run(overwrite_output=True)
+
+            with ThreadPoolExecutor(max_workers=n_segments) as executor:
+                list(executor.map(encode_segment, range(len(path_segments))))
+
+            # segments paths are relative to the list file
+            path_list = path_tmp / "segments.txt"
+            path_list.write_text(
+                "".join(f"file '{path_segment.name}'\n" for path_segment in path_encoded_segments), encoding="utf-8"
+            )
+
+            # lossless concatenation of encoded segments with input audio stream
+            streams = [ffmpeg.input(str(path_list), f="concat", safe=0)["v"]]
+            output_params = {"vcodec": "copy"}
+
+            if self.has_audio:
+                streams.append(self.media["a"])
+                output_params.update(audio_params)
+
+            if compress_params["vcodec"] == "libx265":
+                output_params["vtag"] = "hvc1"
+
+            ffmpeg.output(*streams, path, loglevel=loglevel, **output_params).run(overwrite_output=True)
+
+        self.stats["video_segments"] = len(path_segments)
 
     def __write_mp4(self, path, compress_params):
         """Compress and write a MP4 video with ffmpeg.
@@ -24,33 +280,44 @@ class VideoMedia(AbstractMedia):
             path (str): Input path.
             compress_params (dict): Compression parameters.
         """
-        self.media.output(
-            path,
-            vcodec=compress_params["vcodec"],
-            crf=compress_params["crf"],
-            pix_fmt=compress_params["pix_fmt"],
-            preset=compress_params["preset"],
-            acodec=compress_params["acodec"],
-            audio_bitrate=compress_params["audio_bitrate"],
-            loglevel=compress_params["loglevel"],
-            **{"x265-params": compress_params["libx265_loglevel"]},
-        ).run()
-
-    def read(self, path):
+        # explicit threads budget given by the scheduler, else ffmpeg uses all cores
+        threads = compress_params.get("threads", 0)
+
+        if self.__is_segmented(compress_params):
+            self.__write_mp4_segments(path, compress_params, threads)
+            return
+
+        # partial output of an interrupted run is overwritten, ffmpeg would otherwise prompt and fail
+        video_params, audio_params = self.__get_mp4_params(compress_params, threads)
+        self.media.output(path, loglevel=compress_params["loglevel"], **video_params, **audio_params).run(
+            overwrite_output=True
+        )
+
+    kind = "video"
+
+    readers = {
+        DataTypesIn.VIDEO_FFMPEG.name: __read_ffmpeg,
+    }
+
+    writers = {
+        "MP4": __write_mp4,
+    }
+
+    def read(self, path, compress_params):
         """Read a video file.
 
         Args:
             path (str): Input path.
+            compress_params (dict): Compression parameters.
 
         Raises:
             TypeError: Unknown input format.
         """
-        if self.dtype_in["category"] == DataTypesIn.VIDEO_FFMPEG.name:
-            self.__read_ffmpeg(path)
-
-        else:
+        if self.dtype_in["category"] not in self.readers:
             raise TypeError(f"Unknown input format. Found {self.dtype_in}.")
 
+        self.readers[self.dtype_in["category"]](self, path, compress_params)
+
     def write(self, path, compress_params):
         """Compress a video and write.
 
@@ -61,8 +328,7 @@ class VideoMedia(AbstractMedia):
         Raises:
             TypeError: Unknown input format.
         """
-        if self.dtype_out["fmt"] == "MP4":
-            self.__write_mp4(path, compress_params["MP4"])
-
-        else:
+        if self.dtype_out["fmt"] not in self.writers:
             raise TypeError(f"Unknown output format. Found {self.dtype_out}.")
+
+        self.writers[self.dtype_out["fmt"]](self, path, compress_params[self.dtype_out["fmt"]])
@@ -0,0 +1,402 @@
+"""Dry run planning functions, to estimate output size and run time before compressing a directory.
+
+Input files are grouped by data type category, format and size bucket, a few files of each group are
+compressed in memory, and the group output size and compression time are extrapolated from them.
+"""
+
+import copy
+import json
+import os
+import platform
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from mediaz.compress import check_config, encode, get_lanes_budget, get_workers
+from mediaz.dtype.dtype import get_dtype
+from mediaz.dtype.dtype_support import DataTypesIn
+from mediaz.manifest import get_config_hash
+from mediaz.stats import TIMING_COLUMNS
+from mediaz.utils import get_files_paths, get_logger
+
+logger = get_logger(__name__)
+
+# bump version when calibration samples change, cached samples of older versions are ignored
+CALIBRATION_VERSION = 2
+
+# upper bounds of input size buckets in MB, last bucket has no upper bound
+SIZE_BUCKETS_MB = [1, 8, 64, 512]
+
+# maximum number of cached samples by group
+MAX_CACHED_SAMPLES = 32
+
+# read size while measuring unknown format files
+CHUNK_SIZE = 1024 * 1024
+
+# data type category of video files, encoded with a threads budget
+VIDEO_CATEGORY = DataTypesIn.VIDEO_FFMPEG.name
+
+
+def get_size_bucket(size):
+    """Get size bucket name of an input file.
+
+    Args:
+        size (int): Input file size.
+
+    Returns:
+        str: Size bucket name ("0-1MB", "1-8MB", ..., ">512MB").
+    """
+    lower = 0
+
+    for upper in SIZE_BUCKETS_MB:
+        if size < upper * 1024**2:
+            return f"{lower}-{upper}MB"
+
+        lower = upper
+
+    return f">{lower}MB"
+
+
+def get_group(path_in_file, in_size):
+    """Get sampling group of an input file: data type category, format and size bucket.
+
+    Args:
+        path_in_file (pathlib.Path): Input file path.
+        in_size (int): Input file size.
+
+    Returns:
+        tuple: Data type category ("UNKNOWN" for unknown formats), format and size bucket names.
+    """
+    dtype = get_dtype(DataTypesIn, ext=path_in_file.suffix)
+
+    if dtype is None:
+        return "UNKNOWN", path_in_file.suffix.lower() or "none", get_size_bucket(in_size)
+
+    return dtype["category"], dtype["fmt"], get_size_bucket(in_size)
+
+
+def select_samples(indices, n_samples):
+    """Select files evenly spread over a group, so that the same files are sampled by repeated plans.
+
+    Args:
+        indices (list): Indices of group files, sorted by input path.
+        n_samples (int): Number of samples.
+
+    Returns:
+        list: Indices of sampled files.
+    """
+    n_samples = min(n_samples, len(indices))
+    return [indices[int((i + 0.5) * len(indices) / n_samples)] for i in range(n_samples)]
+
+
+def get_plan_config(config, video_threads):
+    """Get config used to compress samples.
+    Larger outputs are never replaced by input files (replacement is applied on output size instead),
+    so that samples are never copied, and outputs are kept in memory. Videos are encoded with the threads
+    budget of a video job of the planned run.
+
+    Args:
+        config (dict): Config dictionary.
+        video_threads (int): Number of threads per video job of the planned run (see get_lanes_budget),
+            0 keeps config threads (serial run).
+
+    Returns:
+        dict: Samples config dictionary.
+    """
+    config_plan = copy.deepcopy(config)
+    config_plan["copy_if_larger"] = False
+    config_plan["skip_prediction"] = {"enabled": False}
+    config_plan["max_buffer_size"] = 1024**4
+
+    if video_threads > 0:
+        config_plan["compress_params"]["MP4"]["threads"] = video_threads
+
+    return config_plan
+
+
+def measure_sample(path_in_file, path_out_file, in_size, category, config, config_plan):
+    """Measure output size and compression time of a sampled file, without writing its output.
+    Unknown format files are only read, their copy time is estimated from their read time.
+    Videos are written by ffmpeg, their output is removed once measured.
+
+    Args:
+        path_in_file (pathlib.Path): Input file path.
+        path_out_file (pathlib.Path): Temporary output file path.
+        in_size (int): Input file size.
+        category (str): Input data type category.
+        config (dict): Config dictionary.
+        config_plan (dict): Samples config dictionary (see get_plan_config).
+
+    Returns:
+        dict: Sample input size, output size, time in seconds and status.
+    """
+    if category == "UNKNOWN":
+        start = time.perf_counter()
+
+        with open(path_in_file, "rb") as f:
+            while f.read(CHUNK_SIZE):
+                pass
+
+        return {"in_size": in_size, "out_size": in_size, "seconds": time.perf_counter() - start, "status": 0}
+
+    current_stats, _ = encode(path_in_file, path_out_file, config_plan, in_size, defer_write=True)
+    Path(current_stats["out_path"][0]).unlink(missing_ok=True)
+
+    status, out_size = current_stats["status"][0], current_stats["out_size"][0]
+    seconds = sum(current_stats[column][0] or 0.0 for column in TIMING_COLUMNS)
+
+    # larger output would be replaced by input file
+    if status == 1 and config["copy_if_larger"] and out_size > in_size:
+        status, out_size = 2, in_size
+
+    return {"in_size": in_size, "out_size": out_size, "seconds": seconds, "status": status}
+
+
+def read_calibration(path_cache):
+    """Read cached calibration samples.
+
+    Args:
+        path_cache (pathlib.Path or None): Calibration cache directory path, no cache if None.
+
+    Returns:
+        dict: Calibration samples by calibration key.
+    """
+    if path_cache is None or not (path_cache / "calibration.json").is_file():
+        return {}
+
+    try:
+        with open(path_cache / "calibration.json", "r", encoding="utf-8") as f:
+            calibration = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+    if calibration.get("version") != CALIBRATION_VERSION:
+        return {}
+
+    return calibration["samples"]
+
+
+def write_calibration(path_cache, samples):
+    """Write calibration samples to the cache.
+
+    Args:
+        path_cache (pathlib.Path or None): Calibration cache directory path, no cache if None.
+        samples (dict): Calibration samples by calibration key.
+    """
+    if path_cache is None:
+        return
+
+    path_cache.mkdir(parents=True, exist_ok=True)
+    path_tmp = path_cache / f".calibration_{os.getpid()}.json"
+
+    with open(path_tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CALIBRATION_VERSION, "samples": samples}, f)
+
+    os.replace(path_tmp, path_cache / "calibration.json")
+
+
+def get_calibration_key(config_hash, group, threads):
+    """Get calibration key of a group, samples are only reused on the same host with the same config.
+
+    Args:
+        config_hash (str): Config hash.
+        group (tuple): Data type category, format and size bucket names.
+        threads (int): Number of threads of a sample job.
+
+    Returns:
+        str: Calibration key.
+    """
+    return "|".join([platform.node(), config_hash, *group, str(threads)])
+
+
+def extrapolate_group(samples, n_files, in_size):
+    """Extrapolate output size and compression time of a group from its samples.
+
+    Args:
+        samples (list): Group samples.
+        n_files (int): Number of group files.
+        in_size (int): Total input size of group files.
+
+    Returns:
+        float: Estimated output size.
+        float: Estimated compression time in seconds (single worker).
+    """
+    sample_in = sum(sample["in_size"] for sample in samples)
+    sample_out = sum(sample["out_size"] for sample in samples)
+    sample_seconds = sum(sample["seconds"] for sample in samples)
+
+    # empty files, estimate by file
+    if sample_in == 0:
+        return float(in_size), sample_seconds / len(samples) * n_files
+
+    return in_size * sample_out / sample_in, in_size * sample_seconds / sample_in
+
+
+def plan_run(config, path_in, index, workers):
+    """Estimate output size, savings and run time of a compression run, without writing any output.
+    A stratified sample (by data type category, format and size bucket) is compressed in memory, and results
+    are extrapolated to all files. Samples are cached, so that plans on similar content only measure new groups.
+
+    Estimates are rough: compression time is measured on this host, skip prediction is not simulated
+    (it only saves time), and output writes are not measured.
+
+    Args:
+        config (dict): Config dictionary.
+        path_in (pathlib.Path): Input directory path.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+        workers (int): Number of CPU cores of the planned run.
+
+    Returns:
+        dict: Plan, with "categories" estimates by data type category and "total" estimates.
+    """
+    check_config(config)
+
+    n_samples = config.get("plan_samples", 3)
+    path_cache = None if config.get("plan_cache") is None else Path(config["plan_cache"]).expanduser()
+    config_hash = get_config_hash(config)
+    calibration = read_calibration(path_cache)
+    workers = get_workers(workers)
+
+    with tempfile.TemporaryDirectory(prefix="mediaz_plan_") as path_tmp:
+        path_tmp = Path(path_tmp)
+
+        # output paths are only used for their extention, samples are written flat in temporary directory
+        path_in_files, path_out_files = get_files_paths(
+            path_in, path_tmp, config["out_dtype"], config["apply_snake_case"], index
+        )
+
+        groups = defaultdict(list)
+
+        for idx, path_in_file in enumerate(path_in_files):
+            groups[get_group(path_in_file, index.get_size(path_in_file))].append(idx)
+
+        # video samples use the threads of a video job of the planned run, not all cores, the threads budget
+        # only applies to the parallel path (see iter_jobs), serial runs keep config threads (0: ffmpeg default)
+        video_threads = 0
+
+        if workers > 1 or config.get("prefetch_mb", 0) > 0:
+            n_video_files = sum(len(indices) for group, indices in groups.items() if group[0] == VIDEO_CATEGORY)
+            _, _, video_threads = get_lanes_budget(
+                workers,
+                config.get("video_workers", 1),
+                config.get("video_threads", 0),
+                len(path_in_files) - n_video_files,
+                n_video_files,
+            )
+
+        config_plan = get_plan_config(config, video_threads)
+
+        estimates = []
+
+        for group, indices in sorted(groups.items()):
+            key = get_calibration_key(config_hash, group, video_threads if group[0] == VIDEO_CATEGORY else 1)
+            samples = calibration.get(key, [])
+            measured = {sample["path"] for sample in samples}
+
+            # cached samples of similar files are reused, only missing samples are measured
+            for idx in select_samples(indices, n_samples):
+                if len(samples) >= min(n_samples, len(indices)):
+                    break
+
+                if str(path_in_files[idx]) in measured:
+                    continue
+
+                sample = measure_sample(
+                    path_in_files[idx],
+                    path_tmp / f"sample_{idx}{path_out_files[idx].suffix}",
+                    index.get_size(path_in_files[idx]),
+                    group[0],
+                    config,
+                    config_plan,
+                )
+                samples.append({"path": str(path_in_files[idx]), **sample})
+
+            calibration[key] = samples[-MAX_CACHED_SAMPLES:]
+
+            in_size = sum(index.get_size(path_in_files[idx]) for idx in indices)
+            out_size, seconds = extrapolate_group(samples, len(indices), in_size)
+            estimates.append((group, len(indices), in_size, out_size, seconds))
+
+    write_calibration(path_cache, calibration)
+
+    return summarize_plan(estimates, config, workers)
+
+
+def summarize_plan(estimates, config, workers):
+    """Summarize groups estimates by data type category, and estimate wall clock time with image and video lanes.
+    Video samples are measured with the threads of a video job (see get_plan_config), each one uses these cores.
+
+    Args:
+        estimates (list): Groups estimates (group, number of files, input size, output size, time in seconds).
+        config (dict): Config dictionary.
+        workers (int): Number of CPU cores of the planned run.
+
+    Returns:
+        dict: Plan, with "categories" estimates by data type category and "total" estimates.
+    """
+    categories = defaultdict(lambda: {"files": 0, "in_size": 0, "out_size": 0.0, "seconds": 0.0})
+
+    for group, n_files, in_size, out_size, seconds in estimates:
+        category = categories[group[0]]
+        category["files"] += n_files
+        category["in_size"] += in_size
+        category["out_size"] += out_size
+        category["seconds"] += seconds
+
+    # videos run in their own lane, images and copies share the image lane
+    videos = categories.get(VIDEO_CATEGORY, {"files": 0, "seconds": 0.0})
+    n_video_files, video_seconds = videos["files"], videos["seconds"]
+    n_image_files = sum(category["files"] for category in categories.values()) - n_video_files
+    image_seconds = sum(category["seconds"] for category in categories.values()) - video_seconds
+
+    _, video_workers, video_threads = get_lanes_budget(
+        workers, config.get("video_workers", 1), config.get("video_threads", 0), n_image_files, n_video_files
+    )
+
+    # image jobs fill cores left by video jobs, run lasts at least as long as the video lane
+    wall_time = max(
+        (image_seconds + video_seconds * video_threads) / workers,
+        video_seconds / video_workers if video_workers > 0 else 0.0,
+    )
+
+    for category in categories.values():
+        category["savings"] = 1 - category["out_size"] / category["in_size"] if category["in_size"] > 0 else 0.0
+
+    in_size = sum(category["in_size"] for category in categories.values())
+    out_size = sum(category["out_size"] for category in categories.values())
+
+    return {
+        "workers": workers,
+        "categories": dict(categories),
+        "total": {
+            "files": n_image_files + n_video_files,
+            "in_size": in_size,
+            "out_size": out_size,
+            "savings": 1 - out_size / in_size if in_size > 0 else 0.0,
+            "seconds": image_seconds + video_seconds,
+            "wall_time": wall_time,
+        },
+    }
+
+
+def log_plan(plan):
+    """Log plan estimates by data type category and in total.
+
+    Args:
+        plan (dict): Plan (see plan_run).
+    """
+    rows = sorted(plan["categories"].items()) + [("TOTAL", plan["total"])]
+
+    for name, estimate in rows:
+        logger.info(
+            "Plan %s: %s files, %.1f MB -> %.1f MB (%.1f%% savings), %.1fs of compression.",
+            name,
+            estimate["files"],
+            estimate["in_size"] / 1024**2,
+            estimate["out_size"] / 1024**2,
+            100 * estimate["savings"],
+            estimate["seconds"],
+        )
+
+    logger.info("Plan estimated wall clock time with %s workers: %.1fs.", plan["workers"], plan["total"]["wall_time"])
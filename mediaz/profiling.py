@@ -0,0 +1,72 @@
+"""Run profiling functions."""
+
+import contextlib
+import cProfile
+import io
+import pstats
+import tracemalloc
+
+# available profilers
+PROFILERS = ("cprofile", "tracemalloc")
+
+# number of entries written in profile text reports
+PROFILE_TOP = 50
+
+
+@contextlib.contextmanager
+def profile_run(profiler, path_summary):
+    """Profile the wrapped code and write the profile in summary directory.
+    Only the current process is profiled, work done in worker processes is not measured.
+
+    - cprofile: profile.prof (pstats / snakeviz compatible) and profile.txt sorted by cumulative time.
+    - tracemalloc: tracemalloc.txt with peak traced memory and largest allocations by line.
+
+    Args:
+        profiler (str or None): Profiler name ("cprofile" or "tracemalloc"), nothing is profiled if None.
+        path_summary (pathlib.Path): Project summary path.
+
+    Raises:
+        ValueError: Unknown profiler.
+
+    Yields:
+        None: Profiled context.
+    """
+    if profiler is None:
+        yield
+        return
+
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler. Expect one of {PROFILERS}, but found {profiler}.")
+
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(str(path_summary / "profile.prof"))
+
+            report = io.StringIO()
+            pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP)
+
+            with open(path_summary / "profile.txt", "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
+
+    else:
+        tracemalloc.start(25)
+
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            with open(path_summary / "tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"Current traced memory: {current / 1024**2:.1f} MB\n")
+                f.write(f"Peak traced memory: {peak / 1024**2:.1f} MB\n\n")
+
+                for statistic in snapshot.statistics("lineno")[:PROFILE_TOP]:
+                    f.write(f"{statistic}\n")
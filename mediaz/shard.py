@@ -0,0 +1,121 @@
+"""Sharding functions, to split a compression task between several processes or hosts."""
+
+import hashlib
+import json
+import re
+
+from mediaz.manifest import read_manifest
+from mediaz.stats import STATS_COLUMNS, StatsRecorder, write_timings_summary
+from mediaz.utils import get_files_paths, get_logger, verify_number_of_files
+
+logger = get_logger(__name__)
+
+
+def parse_shard(shard):
+    """Parse a shard string "i/N", shard index i is in [0, N - 1].
+
+    Args:
+        shard (str): Shard string.
+
+    Raises:
+        ValueError: Invalid shard string.
+
+    Returns:
+        tuple: Shard index and number of shards.
+    """
+    match = re.fullmatch(r"(\d+)/(\d+)", shard.strip())
+
+    if match is None or int(match.group(2)) < 1 or int(match.group(1)) >= int(match.group(2)):
+        raise ValueError(f"Invalid shard. Expect i/N with 0 <= i < N, but found {shard}.")
+
+    return int(match.group(1)), int(match.group(2))
+
+
+def get_shard_name(shard):
+    """Get shard name used in shard files names.
+
+    Args:
+        shard (tuple): Shard index and number of shards.
+
+    Returns:
+        str: Shard name.
+    """
+    return f"shard_{shard[0]}_of_{shard[1]}"
+
+
+def in_shard(path_in_file, path_in, shard):
+    """Check if an input file belongs to a shard.
+    Files are partitioned by a hash of their path relative to input directory, so that the partition
+    does not depend on the host, the mount point or the files order.
+
+    Args:
+        path_in_file (pathlib.Path): Input file path.
+        path_in (pathlib.Path): Input directory path.
+        shard (tuple or None): Shard index and number of shards, every file belongs to a None shard.
+
+    Returns:
+        bool: True if input file belongs to the shard.
+    """
+    if shard is None:
+        return True
+
+    digest = hashlib.sha256(path_in_file.relative_to(path_in).as_posix().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard[1] == shard[0]
+
+
+def merge_shards(path_summary, path_in_files):
+    """Merge statistics and manifests of shards into project statistics and manifest files, and build
+    the timings summary of merged files. Shards files are removed once merged, so that merging again is a no-op.
+
+    Args:
+        path_summary (pathlib.Path): Project summary path.
+        path_in_files (list): List of input files paths, used to sort statistics rows in input files order.
+
+    Returns:
+        int: Number of merged shards files.
+    """
+    path_shards_stats = sorted(path_summary.glob("stats_shard_*.jsonl"))
+    path_shards_manifests = sorted(path_summary.glob("manifest_shard_*.jsonl"))
+    path_shards_timings = sorted(path_summary.glob("timings_shard_*.json"))
+
+    # entries are appended, last entry of an input file wins when reading, so an interrupted merge can be run again
+    with open(path_summary / "manifest.jsonl", "a", encoding="utf-8") as f:
+        for path_shard_manifest in path_shards_manifests:
+            for entry in read_manifest(path_shard_manifest).values():
+                f.write(json.dumps(entry) + "\n")
+
+    rows = []
+
+    with StatsRecorder(path_summary) as stats_recorder:
+        for path_shard_stats in path_shards_stats:
+            for row in StatsRecorder(path_summary, path_shard_stats.stem).read().values():
+                stats_recorder.record({column: [row.get(column)] for column in STATS_COLUMNS})
+                rows.append(row)
+
+    stats_recorder.write_stats(path_in_files)
+
+    # shards timings summaries are replaced by the summary of all merged files
+    if len(rows) > 0:
+        write_timings_summary(rows, path_summary, logger)
+
+    for path in path_shards_stats + path_shards_manifests + path_shards_timings:
+        path.unlink()
+
+    return len(path_shards_stats) + len(path_shards_manifests) + len(path_shards_timings)
+
+
+def merge_project(config, path_in, path_data, path_summary, index):
+    """Merge shards of a project once all shards are done, then verify the whole project.
+
+    Args:
+        config (dict): Config dictionary.
+        path_in (pathlib.Path): Input directory path.
+        path_data (pathlib.Path): Project data path.
+        path_summary (pathlib.Path): Project summary path.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+    """
+    path_in_files, _ = get_files_paths(path_in, path_data, config["out_dtype"], config["apply_snake_case"], index)
+
+    logger.info("Merged %s shards files.", merge_shards(path_summary, path_in_files))
+
+    verify_number_of_files(path_in, path_data, index)
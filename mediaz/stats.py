@@ -0,0 +1,230 @@
+"""Statistics functions."""
+
+import json
+from pathlib import Path
+
+STATS_COLUMNS = [
+    "in_path",
+    "in_size",
+    "out_path",
+    "out_compressed_size",
+    "out_size",
+    "status",
+    "jpeg_quality",
+    "video_action",
+    "in_duration",
+    "video_segments",
+    "copy_method",
+    "duplicate_of",
+    "time_stat",
+    "time_read",
+    "time_convert",
+    "time_write",
+    "time_copy",
+]
+
+# columns of stages timings in seconds
+TIMING_COLUMNS = ["time_stat", "time_read", "time_convert", "time_write", "time_copy"]
+
+
+def init_stats():
+    """Initialize statistics dictionary of a file.
+    Columns that do not apply to the file (video columns of an image, ...) keep their None value.
+
+    Returns:
+        dict: Statistics dictionary with a None value for each column.
+    """
+    return {column: [None] for column in STATS_COLUMNS}
+
+
+class StatsRecorder:
+    """Record files statistics in a JSON lines log as soon as each file is done.
+    The log survives an interrupted run, and the final statistics file is built from it in one pass.
+    """
+
+    def __init__(self, path_summary, name="stats"):
+        """Initialize object.
+
+        Args:
+            path_summary (pathlib.Path): Project summary path.
+            name (str, optional): Statistics log name, shards have their own log. Defaults to "stats".
+        """
+        self.path_log = path_summary / f"{name}.jsonl"
+        self.path_stats = path_summary / "stats.json"
+        self.file = None
+
+        # log position where rows of this session start
+        self.offset = 0
+
+    def __enter__(self):
+        """Open statistics log in append mode.
+
+        Returns:
+            StatsRecorder: Recorder object.
+        """
+        # project created before statistics log existed, seed log with its statistics file
+        if self.path_log.name == "stats.jsonl" and not self.path_log.is_file() and self.path_stats.is_file():
+            import pandas as pd
+
+            stats = pd.read_json(str(self.path_stats))
+
+            with open(self.path_log, "w", encoding="utf-8") as f:
+                for row in stats.to_dict(orient="records"):
+                    f.write(json.dumps({column: row.get(column) for column in STATS_COLUMNS}) + "\n")
+
+        self.file = open(self.path_log, "a", encoding="utf-8")
+        self.offset = self.file.tell()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close statistics log.
+
+        Args:
+            exc_type (type or None): Exception type.
+            exc_value (Exception or None): Exception.
+            traceback (traceback or None): Exception traceback.
+        """
+        self.file.close()
+        self.file = None
+
+    def record(self, current_stats):
+        """Append statistics of a file to the log.
+
+        Args:
+            current_stats (dict): Statistics dictionary of a file.
+        """
+        row = {column: current_stats[column][0] for column in STATS_COLUMNS}
+        self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def iter_rows(self, offset=0):
+        """Iterate over statistics log rows.
+
+        Args:
+            offset (int, optional): Log position of the first row. Defaults to 0.
+
+        Yields:
+            dict: Statistics row.
+        """
+        if not self.path_log.is_file():
+            return
+
+        with open(self.path_log, "r", encoding="utf-8") as f:
+            f.seek(offset)
+
+            for line in f:
+                # skip truncated line of an interrupted run
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def read(self):
+        """Read statistics log.
+        If an input file has several rows (file processed again), the last one is kept.
+
+        Returns:
+            dict: Statistics rows by input file path.
+        """
+        return {row["in_path"]: row for row in self.iter_rows()}
+
+    def read_recorded(self):
+        """Read statistics rows recorded during this session, rows are only kept on disk while recording.
+
+        Returns:
+            list: Statistics rows, in recording order.
+        """
+        return list(self.iter_rows(self.offset))
+
+    def write_stats(self, path_in_files):
+        """Build statistics file from the log.
+
+        Args:
+            path_in_files (list): List of input files paths, used to sort rows in input files order.
+        """
+        order = {str(path): idx for idx, path in enumerate(path_in_files)}
+
+        # rows of files that are not inputs anymore are kept at the end
+        rows = sorted(self.read().values(), key=lambda row: order.get(row["in_path"], len(order)))
+
+        import pandas as pd
+
+        stats = pd.DataFrame.from_records(rows, columns=STATS_COLUMNS)
+        stats.to_json(str(self.path_stats))
+
+
+def describe_timings(timings):
+    """Describe stages timings distribution.
+
+    Args:
+        timings (pandas.DataFrame): Stages timings, one column by stage, None if a stage does not apply to a file.
+
+    Returns:
+        dict: Number of files, total, median, 95th percentile and maximum timings by stage.
+    """
+    description = {}
+
+    for column in TIMING_COLUMNS:
+        values = timings[column].dropna()
+
+        if values.empty:
+            continue
+
+        description[column] = {
+            "count": int(values.count()),
+            "total": float(values.sum()),
+            "p50": float(values.quantile(0.5)),
+            "p95": float(values.quantile(0.95)),
+            "max": float(values.max()),
+        }
+
+    return description
+
+
+def get_timings_summary(rows):
+    """Summarize stages timings of all files and by input format (input file extention).
+
+    Args:
+        rows (list): Statistics rows.
+
+    Returns:
+        dict: Timings summary, with "all" and "formats" keys.
+    """
+    import pandas as pd
+
+    timings = pd.DataFrame.from_records(rows, columns=["in_path"] + TIMING_COLUMNS)
+    timings[TIMING_COLUMNS] = timings[TIMING_COLUMNS].astype(float)
+    formats = timings["in_path"].map(lambda path: Path(path).suffix.lower() or "none")
+
+    return {
+        "all": describe_timings(timings),
+        "formats": {fmt: describe_timings(group) for fmt, group in timings.groupby(formats)},
+    }
+
+
+def write_timings_summary(rows, path_summary, logger, name="timings"):
+    """Write stages timings summary of processed files in summary directory and log it.
+
+    Args:
+        rows (list): Statistics rows of processed files.
+        path_summary (pathlib.Path): Project summary path.
+        logger (logging.Logger): Logger.
+        name (str, optional): Timings summary file name, without extention. Defaults to "timings".
+    """
+    summary = get_timings_summary(rows)
+
+    with open(path_summary / f"{name}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    for group, description in [("all", summary["all"])] + sorted(summary["formats"].items()):
+        for stage, values in description.items():
+            logger.info(
+                "Timings %s %s: %s files, total %.3fs, p50 %.3fs, p95 %.3fs, max %.3fs.",
+                group,
+                stage,
+                values["count"],
+                values["total"],
+                values["p50"],
+                values["p95"],
+                values["max"],
+            )
@@ -1,15 +1,19 @@
 """Utils functions."""
 
 import datetime
+import io
 import logging
 import logging.config
+import os
 import re
+import tempfile
 from pathlib import Path
 
 import yaml
 
-from mediaz.dtype.dtype import get_dtype
+from mediaz.dtype.dtype import get_dtype, get_media_class
 from mediaz.dtype.dtype_support import DataTypesIn
+from mediaz.walk import index_directory
 
 __logger_config = {
     "version": 1,
@@ -31,6 +35,9 @@ __logger_config = {
     "root": {"level": "DEBUG", "handlers": ["console"]},
 }
 
+# logging is configured by the first get_logger call of the process
+__logger_configured = False
+
 
 def read_yml(path):
     """Read YAML file.
@@ -66,7 +73,12 @@ def get_logger(name):
     Returns:
         logging.Logger: Logger.
     """
-    logging.config.dictConfig(__logger_config)
+    global __logger_configured
+
+    if not __logger_configured:
+        logging.config.dictConfig(__logger_config)
+        __logger_configured = True
+
     return logging.getLogger(name)
 
 
@@ -129,12 +141,33 @@ def rename_path(path, path_root=None):
         return path_root.joinpath(*new_parts)
 
 
-def create_project(path_in, apply_snake_case):
+def create_directories(path_in, path_data, apply_snake_case, exist_ok, index):
+    """Create all nested directories of input directory in output data directory.
+
+    Args:
+        path_in (pathlib.Path): Input directory path to compress.
+        path_data (pathlib.Path): Output data directory path.
+        apply_snake_case (bool): If true, rename files and directories to snake case standard.
+        exist_ok (bool): If true, existing output directories are kept.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+    """
+    # create all nested directory in output root directory
+    for path_directory in index.directories:
+        path_project_directories = path_data / path_directory.relative_to(path_in)
+
+        if apply_snake_case:
+            path_project_directories = rename_path(path_project_directories, path_root=path_data)
+
+        path_project_directories.mkdir(mode=0o777, parents=False, exist_ok=exist_ok)
+
+
+def create_project(path_in, apply_snake_case, index=None):
     """Create project directory.
 
     Args:
         path_in (pathlib.Path): Input directory path to compress.
         apply_snake_case (bool): If true, rename files and directories to snake case standard.
+        index (mediaz.walk.DirectoryIndex, optional): Input directory index, walked if None. Defaults to None.
 
     Returns:
         pathlib.Path: Output data directory path with compressed files.
@@ -155,17 +188,48 @@ def create_project(path_in, apply_snake_case):
     path_data.mkdir(mode=0o777, parents=False, exist_ok=False)
     path_summary.mkdir(mode=0o777, parents=False, exist_ok=False)
 
-    # get all nested subdirectories in input root directory
-    path_in_directories = [path for path in path_in.rglob("*") if path.is_dir()]
+    if index is None:
+        index = index_directory(path_in)
 
-    # create all nested directory in output root directory
-    for path_directory in path_in_directories:
-        path_project_directories = path_data / path_directory.relative_to(path_in)
+    create_directories(path_in, path_data, apply_snake_case, False, index)
 
-        if apply_snake_case:
-            path_project_directories = rename_path(path_project_directories, path_root=path_data)
+    return path_data, path_summary
+
+
+def open_project(path_project, path_in, apply_snake_case, index=None, create=False):
+    """Open an existing project directory to update it incrementally.
+    Input directories created since the project creation are added to the project.
+
+    Args:
+        path_project (pathlib.Path): Existing project directory path.
+        path_in (pathlib.Path): Input directory path to compress.
+        apply_snake_case (bool): If true, rename files and directories to snake case standard.
+        index (mediaz.walk.DirectoryIndex, optional): Input directory index, walked if None. Defaults to None.
+        create (bool, optional): If true, project directory is created if missing. Creation is safe when
+            several processes (shards) open the same project concurrently. Defaults to False.
+
+    Raises:
+        ValueError: Project directory does not contain data and summary directories.
+
+    Returns:
+        pathlib.Path: Output data directory path with compressed files.
+        pathlib.Path: Output summary directory path with statistic file.
+    """
+    path_data = path_project / "data"
+    path_summary = path_project / "summary"
+
+    # directories already created by another process are kept
+    if create:
+        path_data.mkdir(mode=0o777, parents=True, exist_ok=True)
+        path_summary.mkdir(mode=0o777, parents=False, exist_ok=True)
+
+    if not path_data.is_dir() or not path_summary.is_dir():
+        raise ValueError(f"Invalid project directory, data and summary directories not found in: {path_project}")
 
-        path_project_directories.mkdir(mode=0o777, parents=False, exist_ok=False)
+    if index is None:
+        index = index_directory(path_in)
+
+    create_directories(path_in, path_data, apply_snake_case, True, index)
 
     return path_data, path_summary
 
@@ -203,10 +267,11 @@ def sanitize_paths(path_out_files):
     return sanitized_paths
 
 
-def get_files_paths(path_in, path_data, out_dtype, apply_snake_case):
-    """From in and out root directory paths and out data types, get all in and associated out paths.
+def get_output_path(path_in_file, path_in, path_data, out_dtype, apply_snake_case):
+    """Get output path of an input file, before sanitization of same output paths (see sanitize_paths).
 
     Args:
+        path_in_file (pathlib.Path): Input file path.
         path_in (pathlib.Path): Root in directory path.
         path_data (pathlib.Path): Root out directory path.
         out_dtype (dict): Dictionary of out dtype such as:
@@ -214,34 +279,66 @@ def get_files_paths(path_in, path_data, out_dtype, apply_snake_case):
         apply_snake_case (bool): If true, rename files and directories to snake case standard.
 
     Returns:
-        list: List of input files paths.
-        list: List of output files paths.
+        pathlib.Path: Output file path.
     """
-    path_out_files = []
-    path_in_files = [path for path in path_in.rglob("*") if path.is_file()]
+    # get input file data type and its media class with a single lookup
+    dtype = get_dtype(DataTypesIn, ext=path_in_file.suffix)
+    media_class = None if dtype is None else get_media_class(dtype["category"])
+
+    # /path/to/in/dir/aa.png -> /path/to/out/dir/aa.png
+    path_out_file = path_data / path_in_file.relative_to(path_in)
+
+    # prepare path for file copy, keep original ext
+    if media_class is None:
+        path_out_file = path_out_file.with_suffix(path_in_file.suffix.lower())
 
-    for path_in_file in path_in_files:
-        # get input file data type
-        dtype = get_dtype(DataTypesIn, ext=path_in_file.suffix)
+    # prepare path for media file compression, replace with output ext of media kind (image, video)
+    else:
+        path_out_file = path_out_file.with_suffix(out_dtype[media_class.kind]["ext"])
 
-        # /path/to/in/dir/aa.png -> /path/to/out/dir/aa.png
-        path_out_file = path_data / path_in_file.relative_to(path_in)
+    if apply_snake_case:
+        path_out_file = rename_path(path_out_file, path_root=path_data)
 
-        # prepare path for file copy, keep original ext
-        if dtype is None:
-            path_out_files.append(path_out_file.with_suffix(path_in_file.suffix.lower()))
+    return path_out_file
 
-        # prepare path for image file compression, replace with output ext
-        elif dtype["category"] in [DataTypesIn.IMAGE_PIL.name, DataTypesIn.IMAGE_RAW.name]:
-            path_out_files.append(path_out_file.with_suffix(out_dtype["image"]["ext"]))
 
-        # prepare path for video file compression, replace with output ext
-        else:
-            path_out_files.append(path_out_file.with_suffix(out_dtype["video"]["ext"]))
+def get_copy_path(path_in_file, path_out_file):
+    """Get output path of an input file copied instead of being compressed.
+    Output path stem (snake case, sanitization, or stem chosen by caller) is kept, only input file
+    extension replaces output file extension.
 
-    if apply_snake_case:
-        for i, _ in enumerate(path_out_files):
-            path_out_files[i] = rename_path(path_out_files[i], path_root=path_data)
+    Args:
+        path_in_file (pathlib.Path): Input file path.
+        path_out_file (pathlib.Path): Output file path.
+
+    Returns:
+        pathlib.Path: Output file path of the copy.
+    """
+    return path_out_file.with_suffix(path_in_file.suffix.lower())
+
+
+def get_files_paths(path_in, path_data, out_dtype, apply_snake_case, index=None):
+    """From in and out root directory paths and out data types, get all in and associated out paths.
+
+    Args:
+        path_in (pathlib.Path): Root in directory path.
+        path_data (pathlib.Path): Root out directory path.
+        out_dtype (dict): Dictionary of out dtype such as:
+            {'image': {'fmt': 'JPEG', 'ext': '.jpg'}, 'video': {'fmt': 'MP4', 'ext': '.mp4'}}
+        apply_snake_case (bool): If true, rename files and directories to snake case standard.
+        index (mediaz.walk.DirectoryIndex, optional): Input directory index, walked if None. Defaults to None.
+
+    Returns:
+        list: List of input files paths.
+        list: List of output files paths.
+    """
+    if index is None:
+        index = index_directory(path_in)
+
+    path_in_files = index.get_files()
+    path_out_files = [
+        get_output_path(path_in_file, path_in, path_data, out_dtype, apply_snake_case) for path_in_file in path_in_files
+    ]
 
     return path_in_files, sanitize_paths(path_out_files)
 
@@ -265,12 +362,13 @@ def update_stats(stats, data):
     return stats
 
 
-def verify_number_of_files(path_in_directory, path_out_directory):
+def verify_number_of_files(path_in_directory, path_out_directory, index_in=None):
     """Verify that two directoies have the same number of files.
 
     Args:
         path_in_directory (pathlib.Path): Directory path.
         path_out_directory (pathlib.Path): Directory path.
+        index_in (mediaz.walk.DirectoryIndex, optional): Input directory index, walked if None. Defaults to None.
 
     Raises:
         ValueError: Both paths must be directories.
@@ -279,11 +377,144 @@ def verify_number_of_files(path_in_directory, path_out_directory):
     if not path_in_directory.is_dir() or not path_out_directory.is_dir():
         raise ValueError("Both paths must be directories.")
 
-    count_in_directory = sum(1 for p in path_in_directory.glob("**/*") if p.is_file())
-    count_out_directory = sum(1 for p in path_out_directory.glob("**/*") if p.is_file())
+    if index_in is None:
+        index_in = index_directory(path_in_directory)
+
+    count_in_directory = len(index_in.files)
+    count_out_directory = len(index_directory(path_out_directory).files)
 
     if count_in_directory != count_out_directory:
         raise ValueError(
             "Input and output folder do not have the same number of files: "
             f"found {count_in_directory} input files and {count_out_directory} output files."
         )
+
+
+def read_umask():
+    """Read the process umask without changing it (Linux), else by setting it and restoring it.
+    Setting it is not thread safe, files created by other threads meanwhile would get 0666 permissions,
+    it is only done once at import.
+
+    Returns:
+        int: Process umask.
+    """
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# permissions of a regular new file, read once at import before any worker thread is started
+__file_mode = 0o666 & ~read_umask()
+
+
+def get_file_mode():
+    """Get permissions of a regular new file, derived from the process umask read at import.
+    Temporary files are created with 0600 permissions, outputs renamed from them get these permissions.
+
+    Returns:
+        int: File mode.
+    """
+    return __file_mode
+
+
+class SpooledOutput(io.BufferedIOBase):
+    """Binary output file encoded in memory, written to disk only when committed.
+    Data is kept in memory up to a maximum size, then it is spilled to a temporary file
+    in output directory (same file system), which is atomically renamed on commit.
+    """
+
+    def __init__(self, path, max_memory_size):
+        """Initialize object.
+
+        Args:
+            path (pathlib.Path): Output file path.
+            max_memory_size (int): Maximum number of bytes kept in memory.
+        """
+        super().__init__()
+        self.path = path
+        self.max_memory_size = max_memory_size
+        self.buffer = io.BytesIO()
+        self.file = None
+        self.size = 0
+
+    def writable(self):
+        """Output is writable.
+
+        Returns:
+            bool: True.
+        """
+        return True
+
+    def write(self, data):
+        """Write data in memory, or in temporary file once memory size is exceeded.
+
+        Args:
+            data (bytes): Data to write.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        if self.file is None and self.size + len(data) > self.max_memory_size:
+            self.file = tempfile.NamedTemporaryFile(dir=self.path.parent, prefix=".mediaz_", delete=False)
+            self.file.write(self.buffer.getbuffer())
+            self.buffer = io.BytesIO()
+
+        if self.file is None:
+            self.buffer.write(data)
+        else:
+            self.file.write(data)
+
+        self.size += len(data)
+        return len(data)
+
+    def in_memory(self):
+        """Check if data is kept in memory.
+
+        Returns:
+            bool: True if data has not been spilled to a temporary file.
+        """
+        return self.file is None
+
+    def getvalue(self):
+        """Get data kept in memory.
+
+        Raises:
+            ValueError: Data has been spilled to a temporary file.
+
+        Returns:
+            bytes: Output data.
+        """
+        if self.file is not None:
+            raise ValueError(f"Output data has been spilled to a temporary file: {self.file.name}")
+
+        return self.buffer.getvalue()
+
+    def commit(self):
+        """Write output file, with a single write or an atomic rename of the temporary file."""
+        if self.file is None:
+            with open(self.path, "wb") as f:
+                f.write(self.buffer.getbuffer())
+        else:
+            self.file.close()
+            os.chmod(self.file.name, get_file_mode())
+            os.replace(self.file.name, self.path)
+            self.file = None
+
+        self.buffer = io.BytesIO()
+
+    def discard(self):
+        """Discard output data without writing output file."""
+        if self.file is not None:
+            self.file.close()
+            Path(self.file.name).unlink(missing_ok=True)
+            self.file = None
+
+        self.buffer = io.BytesIO()
@@ -0,0 +1,133 @@
+"""Directory walking functions."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class DirectoryIndex:
+    """In memory index of all nested directories and files of a root directory."""
+
+    def __init__(self, path_root, directories, files):
+        """Initialize object.
+
+        Args:
+            path_root (pathlib.Path): Root directory path.
+            directories (list): List of nested directories paths, parents are listed before their children.
+            files (dict): Files sizes and modification times (ns) by file path.
+        """
+        self.path_root = path_root
+        self.directories = directories
+        self.files = files
+
+    def get_files(self):
+        """Get all files paths.
+
+        Returns:
+            list: List of files paths.
+        """
+        return list(self.files.keys())
+
+    def get_size(self, path):
+        """Get file size.
+
+        Args:
+            path (pathlib.Path): File path.
+
+        Returns:
+            int: File size.
+        """
+        return self.files[path][0]
+
+    def get_mtime(self, path):
+        """Get file modification time.
+
+        Args:
+            path (pathlib.Path): File path.
+
+        Returns:
+            int: File modification time in nanoseconds.
+        """
+        return self.files[path][1]
+
+
+def walk_directory(path_directory, directories, files):
+    """Walk a directory recursively with a single scandir call per directory.
+    Entries are sorted by name so that the walk order does not depend on the file system.
+
+    Args:
+        path_directory (pathlib.Path): Directory path.
+        directories (list): List filled with nested directories paths.
+        files (dict): Dictionary filled with files sizes and modification times by file path.
+    """
+    with os.scandir(path_directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+
+    path_subdirectories = []
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            path_subdirectories.append(Path(entry.path))
+
+        elif entry.is_file():
+            stat = entry.stat()
+            files[Path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+
+    for path_subdirectory in path_subdirectories:
+        directories.append(path_subdirectory)
+        walk_directory(path_subdirectory, directories, files)
+
+
+def walk_subdirectory(path_subdirectory):
+    """Walk a top level subdirectory into its own directories and files containers.
+
+    Args:
+        path_subdirectory (pathlib.Path): Subdirectory path.
+
+    Returns:
+        list: List of nested directories paths, including subdirectory path.
+        dict: Files sizes and modification times by file path.
+    """
+    directories, files = [path_subdirectory], {}
+    walk_directory(path_subdirectory, directories, files)
+    return directories, files
+
+
+def index_directory(path_root, workers=1):
+    """Index all nested directories and files of a root directory in a single pass.
+    Top level subdirectories can be walked concurrently, which helps on high latency file systems.
+
+    Args:
+        path_root (pathlib.Path): Root directory path.
+        workers (int, optional): Number of threads walking top level subdirectories. Defaults to 1.
+
+    Raises:
+        ValueError: Root path must be a directory.
+
+    Returns:
+        DirectoryIndex: Directory index.
+    """
+    if not path_root.is_dir():
+        raise ValueError(f"Root path must be a directory: {path_root}")
+
+    with os.scandir(path_root) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+
+    directories, files = [], {}
+    path_subdirectories = []
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            path_subdirectories.append(Path(entry.path))
+
+        elif entry.is_file():
+            stat = entry.stat()
+            files[Path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+
+    # results are merged in subdirectories order to keep the walk deterministic
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for subdirectories, subfiles in executor.map(walk_subdirectory, path_subdirectories):
+            directories.extend(subdirectories)
+            files.update(subfiles)
+
+    return DirectoryIndex(path_root, directories, files)
@@ -0,0 +1,352 @@
+"""Watch mode functions, to compress files continuously arriving in an input directory into a fixed project.
+
+Input directory is polled, so that it works on network file systems without change notifications.
+Only directories whose modification time changed are scanned again (a file created, renamed or removed
+changes the modification time of its directory), and new files are compressed once they are stable.
+Files modified in place do not change the modification time of their directory, processed files are
+checked again on a slower interval.
+"""
+
+import json
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+
+from mediaz.compress import check_config, get_workers, iter_compress
+from mediaz.manifest import get_config_hash, is_unchanged, read_manifest, write_manifest_entry
+from mediaz.stats import StatsRecorder
+from mediaz.utils import get_logger, get_output_path
+
+logger = get_logger(__name__)
+
+# maximum number of files compressed between two scans, so that bursts do not delay new files detection
+BATCH_SIZE = 1000
+
+# directories modified more recently are scanned again on next tick, file systems with a coarse
+# modification time resolution may not change it for entries created right after a scan
+RECENT_MTIME_NS = 2 * 10**9
+
+
+class Watcher:
+    """Poll an input directory and compress new or modified files once they are stable."""
+
+    def __init__(self, config, path_in, path_data, path_summary, index):
+        """Initialize object.
+
+        Args:
+            config (dict): Config dictionary.
+            path_in (pathlib.Path): Input directory path.
+            path_data (pathlib.Path): Project data path.
+            path_summary (pathlib.Path): Project summary path.
+            index (mediaz.walk.DirectoryIndex): Input directory index.
+        """
+        self.config = config
+        self.path_in = path_in
+        self.path_data = path_data
+        self.path_summary = path_summary
+        self.interval = config.get("watch_interval", 5)
+        self.stable = config.get("watch_stable", 10)
+        self.rescan = config.get("watch_rescan", 60)
+        self.last_rescan = time.monotonic()
+        self.workers = get_workers(config.get("workers", 1))
+        self.config_hash = get_config_hash(config)
+        self.stopped = threading.Event()
+
+        # modification time of each watched directory, None to scan it again on next tick
+        self.directories = {path: self.get_directory_mtime(path) for path in [path_in] + index.directories}
+
+        # processed files (size, modification time), and files waiting to be stable ((size, mtime), since)
+        self.files = {}
+        self.pending = {}
+
+        # output path (lowercase) of each processed input file, to avoid same output paths
+        self.manifest = read_manifest(path_summary / "manifest.jsonl")
+        self.outputs = {entry["out_path"].lower(): in_path for in_path, entry in self.manifest.items()}
+
+        now = time.monotonic()
+
+        for path_in_file, state in index.files.items():
+            if is_unchanged(self.manifest.get(str(path_in_file)), *state, self.config_hash):
+                self.files[path_in_file] = state
+            else:
+                self.pending[path_in_file] = (state, now)
+
+        self.counters = {"files": 0, "in_size": 0, "out_size": 0, "busy_time": 0.0, "start": time.time()}
+
+    def get_directory_mtime(self, path_directory):
+        """Get directory modification time, None if it was modified too recently to be trusted.
+
+        Args:
+            path_directory (pathlib.Path): Directory path.
+
+        Returns:
+            int or None: Modification time in nanoseconds.
+        """
+        mtime = path_directory.stat().st_mtime_ns
+        return None if time.time_ns() - mtime < RECENT_MTIME_NS else mtime
+
+    def scan(self):
+        """Scan directories whose modification time changed since last scan, and removed directories.
+        Processed files are checked again every watch_rescan seconds.
+        """
+        for path_directory, mtime in list(self.directories.items()):
+            if path_directory not in self.directories:
+                continue
+
+            try:
+                current_mtime = self.get_directory_mtime(path_directory)
+            except FileNotFoundError:
+                self.remove_directory(path_directory)
+                continue
+
+            if mtime is None or current_mtime != mtime:
+                self.directories[path_directory] = current_mtime
+                self.scan_directory(path_directory)
+
+        if self.rescan > 0 and time.monotonic() - self.last_rescan >= self.rescan:
+            self.rescan_files()
+            self.last_rescan = time.monotonic()
+
+    def rescan_files(self):
+        """Check processed files again, files modified in place are added to pending files."""
+        now = time.monotonic()
+
+        for path, state in self.files.items():
+            if path in self.pending:
+                continue
+
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            if (stat.st_size, stat.st_mtime_ns) != state:
+                self.pending[path] = ((stat.st_size, stat.st_mtime_ns), now)
+
+    def scan_directory(self, path_directory):
+        """Scan a directory, new files are added to pending files and new subdirectories are scanned.
+
+        Args:
+            path_directory (pathlib.Path): Directory path.
+        """
+        try:
+            with os.scandir(path_directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+
+        now = time.monotonic()
+
+        for entry in entries:
+            path = Path(entry.path)
+
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if path not in self.directories:
+                        self.directories[path] = self.get_directory_mtime(path)
+                        self.scan_directory(path)
+
+                elif entry.is_file():
+                    stat = entry.stat()
+                    state = (stat.st_size, stat.st_mtime_ns)
+
+                    if self.files.get(path) != state and path not in self.pending:
+                        self.pending[path] = (state, now)
+
+            # entry removed while scanning
+            except FileNotFoundError:
+                continue
+
+    def remove_directory(self, path_directory):
+        """Stop watching a removed directory and its subdirectories.
+
+        Args:
+            path_directory (pathlib.Path): Directory path.
+        """
+        for path in list(self.directories):
+            if path == path_directory or path_directory in path.parents:
+                del self.directories[path]
+
+    def get_stable_files(self):
+        """Get pending files whose size and modification time did not change for watch_stable seconds.
+
+        Returns:
+            list: Stable files paths, at most BATCH_SIZE.
+        """
+        now = time.monotonic()
+        stable = []
+
+        for path, (state, since) in list(self.pending.items()):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns)
+
+            # file is still written
+            if current != state:
+                self.pending[path] = (current, now)
+
+            elif now - since >= self.stable:
+                stable.append(path)
+
+            if len(stable) == BATCH_SIZE:
+                break
+
+        return sorted(stable)
+
+    def get_output_path(self, path_in_file):
+        """Get output path of an input file, mirroring directory structure and snake case renames.
+        An output path already used by another input file gets a counter, as in sanitize_paths.
+
+        Args:
+            path_in_file (pathlib.Path): Input file path.
+
+        Returns:
+            pathlib.Path: Output file path.
+        """
+        path_out_file = get_output_path(
+            path_in_file, self.path_in, self.path_data, self.config["out_dtype"], self.config["apply_snake_case"]
+        )
+        path_candidate, count = path_out_file, 0
+
+        while self.outputs.get(str(path_candidate).lower(), str(path_in_file)) != str(path_in_file):
+            count += 1
+            path_candidate = path_out_file.parent / f"{path_out_file.stem} ({count}){path_out_file.suffix}"
+
+        self.outputs[str(path_candidate).lower()] = str(path_in_file)
+        return path_candidate
+
+    def process(self, path_in_files, stats_recorder, f):
+        """Compress stable files, statistics log, manifest and counters are updated as soon as each file is done.
+
+        Args:
+            path_in_files (list): Stable input files paths.
+            stats_recorder (mediaz.stats.StatsRecorder): Statistics recorder.
+            f (io.TextIOWrapper): Manifest file opened in append mode.
+        """
+        states = [self.pending.pop(path)[0] for path in path_in_files]
+
+        # remove outputs of modified input files, output path can differ from the new one
+        for path_in_file in path_in_files:
+            if str(path_in_file) in self.manifest:
+                Path(self.manifest[str(path_in_file)]["out_path"]).unlink(missing_ok=True)
+
+        path_out_files = [self.get_output_path(path_in_file) for path_in_file in path_in_files]
+
+        # directories created since last scan
+        for path_out_file in path_out_files:
+            path_out_file.parent.mkdir(parents=True, exist_ok=True)
+
+        start = time.monotonic()
+
+        for idx, current_stats in iter_compress(
+            path_in_files, path_out_files, self.config, self.workers, [state[0] for state in states]
+        ):
+            stats_recorder.record(current_stats)
+            write_manifest_entry(f, path_in_files[idx], *states[idx], self.config_hash, current_stats)
+
+            self.files[path_in_files[idx]] = states[idx]
+            self.manifest[str(path_in_files[idx])] = {"out_path": current_stats["out_path"][0]}
+            self.outputs[current_stats["out_path"][0].lower()] = str(path_in_files[idx])
+
+            self.counters["files"] += 1
+            self.counters["in_size"] += current_stats["in_size"][0]
+            self.counters["out_size"] += current_stats["out_size"][0]
+
+        self.counters["busy_time"] += time.monotonic() - start
+        self.write_counters(len(path_in_files), time.monotonic() - start)
+
+    def write_counters(self, n_files, batch_time):
+        """Log throughput of last batch and write session counters in summary directory (watch.json).
+
+        Args:
+            n_files (int): Number of files of last batch.
+            batch_time (float): Last batch time in seconds.
+        """
+        busy_time = max(self.counters["busy_time"], 1e-9)
+        counters = dict(
+            self.counters,
+            files_per_s=self.counters["files"] / busy_time,
+            mb_per_s=self.counters["in_size"] / 1024**2 / busy_time,
+            pending=len(self.pending),
+        )
+
+        with open(self.path_summary / "watch.json", "w", encoding="utf-8") as f:
+            json.dump(counters, f, indent=2)
+
+        logger.info(
+            "Compressed %s files in %.1fs, %s files in session (%.1f files/s, %.1f MB/s), %s files pending.",
+            n_files,
+            batch_time,
+            counters["files"],
+            counters["files_per_s"],
+            counters["mb_per_s"],
+            counters["pending"],
+        )
+
+    def stop(self, signum=None, frame=None):
+        """Stop watching once current batch is done, usable as a signal handler.
+
+        Args:
+            signum (int or None, optional): Signal number. Defaults to None.
+            frame (frame or None, optional): Current stack frame. Defaults to None.
+        """
+        self.stopped.set()
+
+    def run(self):
+        """Watch input directory until stopped (SIGTERM or keyboard interrupt), then write statistics file."""
+        logger.info(
+            "Watching %s directories, %s files already processed, %s files pending.",
+            len(self.directories),
+            len(self.files),
+            len(self.pending),
+        )
+
+        signal.signal(signal.SIGTERM, self.stop)
+
+        with (
+            StatsRecorder(self.path_summary) as stats_recorder,
+            open(self.path_summary / "manifest.jsonl", "a", encoding="utf-8") as f,
+        ):
+            try:
+                while not self.stopped.is_set():
+                    start = time.monotonic()
+                    self.scan()
+                    path_in_files = self.get_stable_files()
+
+                    if len(path_in_files) > 0:
+                        self.process(path_in_files, stats_recorder, f)
+
+                    # a full batch is followed by the next one without waiting
+                    if len(path_in_files) < BATCH_SIZE:
+                        self.stopped.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+            except KeyboardInterrupt:
+                pass
+
+        logger.info("Stopping watch, %s files compressed in session.", self.counters["files"])
+        stats_recorder.write_stats(sorted(self.files))
+
+
+def watch(config, path_in, path_data, path_summary, index):
+    """Watch an input directory and compress new or modified files into a fixed project until stopped.
+
+    Args:
+        config (dict): Config dictionary.
+        path_in (pathlib.Path): Input directory path.
+        path_data (pathlib.Path): Project data path.
+        path_summary (pathlib.Path): Project summary path.
+        index (mediaz.walk.DirectoryIndex): Input directory index.
+
+    Raises:
+        KeyError: Invalid out dtype keys.
+        TypeError: Invalid output format.
+        ValueError: Invalid copy mode.
+    """
+    check_config(config)
+    Watcher(config, path_in, path_data, path_summary, index).run()
@@ -4,28 +4,92 @@ import argparse
 from pathlib import Path
 from pprint import pformat
 
-from mediaz.compress import bulk_compress
-from mediaz.utils import create_project, get_logger, read_yml, write_yml
+from mediaz.api import bulk_compress
+from mediaz.compress import get_workers
+from mediaz.jobqueue import run_queue
+from mediaz.plan import log_plan, plan_run
+from mediaz.profiling import PROFILERS, profile_run
+from mediaz.shard import merge_project, parse_shard
+from mediaz.utils import create_project, get_logger, open_project, read_yml, write_yml
+from mediaz.walk import index_directory
+from mediaz.watch import watch
 
 logger = get_logger(__name__)
 
 
-def run(path_config, no_progress_bar):
+def run(path_config, no_progress_bar, workers, path_project, profiler, shard, merge, queue, plan, watch_mode):
     """Compression run function.
 
     Args:
         path_config (str): Config YAML file path.
         no_progress_bar (bool): Enable or disable tqdm progress bar.
+        workers (int or None): Number of worker processes, overrides config value if not None.
+        path_project (str or None): Existing project directory path to update, a new project is created if None.
+        profiler (str or None): Profiler wrapping the compression ("cprofile" or "tracemalloc"), none if None.
+        shard (str or None): Shard "i/N" processed in a shared project, all files are processed if None.
+        merge (bool): If true, merge shards of the project instead of compressing files.
+        queue (bool): If true, run a worker of the project jobs queue, other workers can join the same project.
+        plan (bool): If true, only estimate output size and run time of the run, nothing is written.
+        watch_mode (bool): If true, watch input directory and compress new files into the project until stopped.
+
+    Raises:
+        ValueError: Project path is required for a shard, a merge, a queue worker or a watch.
     """
+    if (shard is not None or merge or queue or watch_mode) and path_project is None:
+        raise ValueError(
+            "A project path (-pp) is required to run a shard, to merge shards, to run a queue or to watch."
+        )
+
+    shard = None if shard is None else parse_shard(shard)
+
     config = read_yml(path_config)
+
+    if workers is not None:
+        config["workers"] = workers
+
     logger.info("Using config:\n %s \n", pformat(config))
 
     path_directory = Path(config["in_path"]).expanduser()
-    path_data, path_summary = create_project(path_directory, config["apply_snake_case"])
+
+    # walk input directory once, index is shared by project creation, compression and verification
+    index = index_directory(path_directory, config.get("walk_workers", 1))
+
+    # dry run, no project is created
+    if plan:
+        log_plan(plan_run(config, path_directory, index, config.get("workers", 1)))
+        return
+
+    if path_project is None:
+        path_data, path_summary = create_project(path_directory, config["apply_snake_case"], index)
+    else:
+        # shards and queue workers create the shared project if needed
+        path_data, path_summary = open_project(
+            Path(path_project).expanduser(),
+            path_directory,
+            config["apply_snake_case"],
+            index,
+            shard is not None or queue or watch_mode,
+        )
+
+    if merge:
+        merge_project(config, path_directory, path_data, path_summary, index)
+        return
 
     write_yml(str(path_summary / "config.yml"), config)
 
-    bulk_compress(config, path_directory, path_data, path_summary, no_progress_bar)
+    if profiler is not None and get_workers(config.get("workers", 1)) > 1:
+        logger.warning("Profiling main process only, work done in worker processes is not profiled.")
+
+    with profile_run(profiler, path_summary):
+        if queue:
+            run_queue(config, path_directory, path_data, path_summary, index)
+            return
+
+        if watch_mode:
+            watch(config, path_directory, path_data, path_summary, index)
+            return
+
+        bulk_compress(config, path_directory, path_data, path_summary, no_progress_bar, index, shard)
 
 
 if __name__ == "__main__":
@@ -47,6 +111,82 @@ if __name__ == "__main__":
         help="Enable / disable progression bar.",
     )
 
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (0 uses all CPU cores). Overrides config value.",
+    )
+
+    parser.add_argument(
+        "-pp",
+        "--path_project",
+        type=str,
+        default=None,
+        help="Path of an existing project to resume or update incrementally.",
+    )
+
+    parser.add_argument(
+        "-pr",
+        "--profile",
+        type=str,
+        choices=PROFILERS,
+        default=None,
+        help="Profile the run with cProfile or tracemalloc, profile is written in project summary directory.",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--shard",
+        type=str,
+        default=None,
+        help="Process shard i/N (0 <= i < N) of input files in the shared project given by -pp.",
+    )
+
+    parser.add_argument(
+        "-m",
+        "--merge",
+        action="store_true",
+        default=False,
+        help="Merge statistics of all shards of the project given by -pp, and verify it.",
+    )
+
+    parser.add_argument(
+        "-q",
+        "--queue",
+        action="store_true",
+        default=False,
+        help="Run a worker of the jobs queue of the project given by -pp, several workers can run concurrently.",
+    )
+
+    parser.add_argument(
+        "-pl",
+        "--plan",
+        action="store_true",
+        default=False,
+        help="Dry run, estimate output size, savings and run time with the given workers from a sample of files.",
+    )
+
+    parser.add_argument(
+        "-wa",
+        "--watch",
+        action="store_true",
+        default=False,
+        help="Watch input directory and compress new files into the project given by -pp, until stopped.",
+    )
+
     args = parser.parse_args()
 
-    run(args.path_config, args.no_progress_bar)
+    run(
+        args.path_config,
+        args.no_progress_bar,
+        args.workers,
+        args.path_project,
+        args.profile,
+        args.shard,
+        args.merge,
+        args.queue,
+        args.plan,
+        args.watch,
+    )